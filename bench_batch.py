@@ -0,0 +1,63 @@
+##
+## bench_batch.py - Batched metadata write benchmark
+##
+## Measures append_file throughput and dataserver writes for a run of small
+## appends to one file, with and without `User.batch()`.
+##
+## Usage:  python3 bench_batch.py [appends] [append size]
+##
+
+import sys
+import time
+
+from support.dataserver import dataserver
+from support.keyserver import keyserver
+from support.instrument import Recorder
+
+import client as c
+
+
+def appends(u, count: int, piece: bytes, batched: bool) -> None:
+    if batched:
+        with u.batch():
+            appends(u, count, piece, False)
+        return
+    for _ in range(count):
+        u.append_file("log", piece)
+
+def run(count: int, size: int, batched: bool, runs: int = 3) -> tuple[float, int, int]:
+    """
+    Returns (best appends per second over `runs`, dataserver Sets, bytes
+    written) for `count` appends of `size` bytes each.  Calls are only
+    counted in a separate run, so recording does not skew the timing.
+    """
+    best, piece = 0.0, b'x' * size
+    for attempt in range(runs + 1):
+        dataserver.Clear()
+        keyserver.Clear()
+        u = c.create_user("usr", "pswd")
+        u.upload_file("log", b'')
+        if attempt == runs:
+            with Recorder(c) as rec:
+                appends(u, count, piece, batched)
+            break
+        start = time.perf_counter()
+        appends(u, count, piece, batched)
+        best = max(best, count / (time.perf_counter() - start))
+        assert len(u.download_file("log")) == count * size
+    sets = rec.totals()["Dataserver.Set"]
+    return best, sets.calls, sets.bytes
+
+def main() -> None:
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    size = int(sys.argv[2]) if len(sys.argv) > 2 else 100
+
+    print(f"{count} appends of {size} bytes")
+    print(f"{'mode':<10} {'appends/s':>10} {'Sets':>8} {'bytes written':>14}")
+    for name, batched in (("unbatched", False), ("batched", True)):
+        rate, sets, written = run(count, size, batched)
+        print(f"{name:<10} {rate:>10.0f} {sets:>8} {written:>14}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+##
+## bench_compact.py - Compaction benchmark
+##
+## Builds a file out of many small append_file calls (a log written one
+## line at a time) and compares cold download_file cost before and after
+## User.compact_file.
+##
+## Usage:  python3 bench_compact.py [number of appends]
+##
+
+import sys
+import time
+
+from support.dataserver import dataserver
+from support.keyserver import keyserver
+
+import client as c
+
+
+def cold_download(u: c.User) -> tuple[float, int]:
+    """
+    Downloads the benchmark file with an empty session cache and returns
+    (seconds, dataserver Gets).
+    """
+    u._session.records.clear()
+    gets = 0
+    original_get = dataserver.Get
+    def counting_get(loc):
+        nonlocal gets
+        gets += 1
+        return original_get(loc)
+    dataserver.Get = counting_get
+    try:
+        start = time.perf_counter()
+        u.download_file("log")
+        return time.perf_counter() - start, gets
+    finally:
+        dataserver.Get = original_get
+
+def main() -> None:
+    appends = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+
+    dataserver.Clear()
+    keyserver.Clear()
+    u = c.create_user("bench", "pswd")
+    u.upload_file("log", b'')
+    for i in range(appends):
+        u.append_file("log", f"{i:08d} INFO request served\n".encode())
+
+    print(f"{'':>8} {'entries':>8} {'gets':>6} {'download ms':>12}")
+    took, gets = cold_download(u)
+    print(f"{'before':>8} {len(dataserver.GetMap()):>8} {gets:>6} {took * 1000:>12.1f}")
+
+    start = time.perf_counter()
+    u.compact_file("log")
+    compact = time.perf_counter() - start
+
+    took, gets = cold_download(u)
+    print(f"{'after':>8} {len(dataserver.GetMap()):>8} {gets:>6} {took * 1000:>12.1f}")
+    print(f"compact_file took {compact * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
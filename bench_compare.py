@@ -0,0 +1,105 @@
+##
+## bench_compare.py - Side-by-side benchmark against the reference client
+##
+## Replays the same workload trace (see bench_trace.py) through client.py
+## and dropbox_client_reference, and reports wall time, dataserver bytes
+## stored and dataserver calls for each, with the relative difference.
+##
+## If the reference client cannot be imported (it is not installed, or the
+## wheel was built for a different Python), the comparison is skipped.
+##
+## Usage:
+##     python3 bench_compare.py [trace.jsonl] [--against MODULE] [--fail-over PCT]
+##
+
+import argparse
+import importlib
+import json
+import time
+
+from support.dataserver import dataserver
+from support.instrument import Recorder
+
+import bench_trace
+
+
+def measure(client, trace: list[dict]) -> dict[str, float]:
+    """
+    Replays `trace` through `client` and returns its cost metrics.
+    """
+    with Recorder(client) as rec:
+        start = time.perf_counter()
+        _, errors, _ = bench_trace.replay(client, trace)
+        took = time.perf_counter() - start
+    totals = rec.totals()
+    stored = dataserver.GetMap()
+    def calls(name: str) -> int:
+        return totals[name].calls if name in totals else 0
+    def moved(name: str) -> int:
+        return totals[name].bytes if name in totals else 0
+
+    return {
+        "wall time (s)": took,
+        "errors": sum(errors.values()),
+        "bytes stored": sum(map(len, stored.values())),
+        "entries stored": len(stored),
+        "Dataserver.Set calls": calls("Dataserver.Set"),
+        "Dataserver.Get calls": calls("Dataserver.Get"),
+        "Dataserver.Delete calls": calls("Dataserver.Delete"),
+        "bytes written": moved("Dataserver.Set"),
+        "bytes read": moved("Dataserver.Get"),
+        "Keyserver calls": calls("Keyserver.Set") + calls("Keyserver.Get"),
+    }
+
+def diff_report(ours: dict[str, float], theirs: dict[str, float],
+                names: tuple[str, str]) -> tuple[str, list[str]]:
+    """
+    Returns the report table and the metrics where `ours` is worse.
+    """
+    lines = [f"{'metric':<24} {names[0]:>14} {names[1]:>14} {'change':>9}"]
+    worse = []
+    for metric, value in ours.items():
+        other = theirs[metric]
+        change = (value - other) / other * 100 if other else 0.0
+        if value > other:
+            worse.append(metric)
+        shown = [f"{v:>14.3f}" if isinstance(v, float) else f"{v:>14}" for v in (value, other)]
+        lines.append(f"{metric:<24} {shown[0]} {shown[1]} {change:>+8.1f}%")
+    return "\n".join(lines), worse
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Compare client.py against another client.")
+    parser.add_argument("trace", nargs="?", help="JSONL trace (default: synthetic)")
+    parser.add_argument("--against", default="dropbox_client_reference",
+                        help="client module to compare with")
+    parser.add_argument("--fail-over", type=float, metavar="PCT",
+                        help="exit 1 if any metric is more than PCT%% worse")
+    args = parser.parse_args()
+
+    if args.trace:
+        with open(args.trace) as f:
+            trace = [json.loads(line) for line in f if line.strip()]
+    else:
+        trace = bench_trace.generate()
+
+    client = importlib.import_module("client")
+    try:
+        other = importlib.import_module(args.against)
+    except Exception as exc:
+        print(f"{args.against} unavailable ({exc}); skipping comparison")
+        return
+
+    ours, theirs = measure(client, trace), measure(other, trace)
+    report, worse = diff_report(ours, theirs, ("client", args.against))
+    print(report)
+
+    if args.fail_over is not None:
+        failed = [metric for metric in worse
+                  if ours[metric] > theirs[metric] * (1 + args.fail_over / 100)]
+        if failed:
+            raise SystemExit(f"more than {args.fail_over}% worse than {args.against}: "
+                             + ", ".join(failed))
+
+
+if __name__ == "__main__":
+    main()
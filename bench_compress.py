@@ -0,0 +1,75 @@
+##
+## bench_compress.py - Chunk compression benchmark
+##
+## Uploads and downloads a mixed corpus (logs, JSON, source code, random
+## and already-compressed data) with each client.COMPRESSION setting and
+## reports storage ratio and throughput.
+##
+## Usage:  python3 bench_compress.py [MB per corpus file]
+##
+
+import glob
+import json
+import random
+import sys
+import time
+import zlib
+
+from support.dataserver import dataserver
+from support.keyserver import keyserver
+
+import client as c
+
+
+def corpus(size: int) -> dict[str, bytes]:
+    rng = random.Random(1660)
+    log = b"".join(f"2024-01-01 12:{i % 60:02d}:{i % 60:02d} INFO worker-{i % 8} served "
+                   f"/api/v1/items/{rng.randrange(10**6)} in {rng.randrange(500)}ms\n".encode()
+                   for i in range(size // 60))
+    records = json.dumps([{"id": i, "name": f"user{rng.randrange(10**4)}",
+                           "tags": rng.sample(["a", "b", "c", "d", "e"], 2)}
+                          for i in range(size // 50)]).encode()
+    source = b"".join(open(path, "rb").read() for path in sorted(glob.glob("*.py")))
+    return {
+        "log": log[:size],
+        "json": records[:size],
+        "source": (source * (size // len(source) + 1))[:size],
+        "random": rng.randbytes(size),
+        "zlib": zlib.compress(rng.randbytes(size // 2) + log[:size // 2]),
+    }
+
+def chunk_bytes() -> int:
+    return sum(len(v) for v in dataserver.GetMap().values())
+
+def main() -> None:
+    size = int(float(sys.argv[1]) * 2**20) if len(sys.argv) > 1 else 2**21
+    files = corpus(size)
+    logical = sum(len(data) for data in files.values())
+
+    print(f"{'codec':>6} {'stored/logical':>15} {'upload MB/s':>12} {'download MB/s':>14}  per file")
+    for codec in ("none", "zlib", "lzma", "auto"):
+        dataserver.Clear()
+        keyserver.Clear()
+        c.COMPRESSION = codec
+        u = c.create_user("bench", "pswd")
+        base = chunk_bytes()
+
+        ratios = []
+        up = down = 0.0
+        for name, data in files.items():
+            before = chunk_bytes()
+            start = time.perf_counter()
+            u.upload_file(name, data)
+            up += time.perf_counter() - start
+            ratios.append(f"{name}={(chunk_bytes() - before) / len(data):.2f}")
+
+            start = time.perf_counter()
+            assert u.download_file(name) == data
+            down += time.perf_counter() - start
+
+        print(f"{codec:>6} {(chunk_bytes() - base) / logical:>15.3f} "
+              f"{logical / up / 2**20:>12.2f} {logical / down / 2**20:>14.2f}  {' '.join(ratios)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+##
+## bench_dedup.py - Deduplication benchmark for upload_file
+##
+## Uploads a synthetic corpus of successive versions of a file (random
+## edits, like a VM image, plus a rotated log) and reports how many bytes
+## each upload adds to the dataserver and how fast it runs.
+##
+## Usage:  python3 bench_dedup.py [size in MB] [versions]
+##
+
+import random
+import sys
+import time
+
+from support.dataserver import dataserver
+from support.keyserver import keyserver
+
+import client as c
+
+
+def stored_bytes() -> int:
+    return sum(len(v) for v in dataserver.GetMap().values())
+
+def edited_versions(base: bytes, count: int, rng: random.Random):
+    """
+    Yields `count` versions of `base`, each one a few small inserts, deletes
+    and overwrites away from the previous one.
+    """
+    data = bytearray(base)
+    for _ in range(count):
+        yield bytes(data)
+        for _ in range(5):
+            pos = rng.randrange(len(data))
+            kind = rng.choice(("insert", "delete", "overwrite"))
+            if kind == "insert":
+                data[pos:pos] = rng.randbytes(rng.randrange(1, 200))
+            elif kind == "delete":
+                del data[pos:pos + rng.randrange(1, 200)]
+            else:
+                data[pos:pos + 100] = rng.randbytes(100)
+
+def rotated_logs(size: int, count: int, rng: random.Random):
+    """
+    Yields `count` versions of a log file that drops its oldest lines and
+    gains new ones between versions.
+    """
+    lines = [f"{i:08d} INFO request served in {rng.randrange(1000)}ms\n".encode()
+             for i in range(size // 40)]
+    step = len(lines) // 10
+    for v in range(count):
+        yield b"".join(lines)
+        start = len(lines) + v * step
+        lines = lines[step:] + [f"{i:08d} WARN slow response {rng.randrange(1000)}ms\n".encode()
+                                for i in range(start, start + step)]
+
+def run(name: str, versions) -> None:
+    dataserver.Clear()
+    keyserver.Clear()
+    u = c.create_user("bench", "pswd")
+
+    logical = stored = 0
+    elapsed = 0.0
+    print(f"\n{name}")
+    print(f"{'version':>8} {'logical':>12} {'new bytes':>12} {'MB/s':>8}")
+    for i, data in enumerate(versions):
+        before = stored_bytes()
+        start = time.perf_counter()
+        u.upload_file(f"{name}.v{i}", data)
+        took = time.perf_counter() - start
+        added = stored_bytes() - before
+
+        logical += len(data)
+        stored += added
+        elapsed += took
+        print(f"{i:>8} {len(data):>12} {added:>12} {len(data) / took / 2**20:>8.2f}")
+
+    print(f"dedup ratio (logical / stored): {logical / stored:.2f}x")
+    print(f"upload throughput: {logical / elapsed / 2**20:.2f} MB/s")
+
+def main() -> None:
+    size = int(float(sys.argv[1]) * 2**20) if len(sys.argv) > 1 else 4 * 2**20
+    count = int(sys.argv[2]) if len(sys.argv) > 2 else 8
+    rng = random.Random(1660)
+
+    run("image", edited_versions(rng.randbytes(size), count, rng))
+    run("log", rotated_logs(size, count, rng))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+##
+## bench_derive.py - Key and memloc derivation benchmark
+##
+## Runs a metadata-heavy workload (many small files, each appended to and
+## downloaded repeatedly) with the per-session derivation caches enabled
+## and disabled, and times memloc.MakeFromBytes against the UUID round
+## trip it used to make for every call.
+##
+## Usage:  python3 bench_derive.py [files] [rounds]
+##
+
+import sys
+import time
+import timeit
+import uuid
+
+from support.dataserver import dataserver, memloc
+from support.keyserver import keyserver
+
+import client as c
+
+
+def workload(files: int, rounds: int) -> float:
+    """
+    Returns the best time over three runs for `rounds` rounds of one append
+    and one download per file.
+    """
+    best = float("inf")
+    for _ in range(3):
+        dataserver.Clear()
+        keyserver.Clear()
+        u = c.create_user("usr", "pswd")
+        for i in range(files):
+            u.upload_file(f"f{i}", b'x' * 100)
+        start = time.perf_counter()
+        for _ in range(rounds):
+            for i in range(files):
+                u.append_file(f"f{i}", b'y')
+                u.download_file(f"f{i}")
+        best = min(best, time.perf_counter() - start)
+        del u
+    return best
+
+def main() -> None:
+    files = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    rounds = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+
+    cached = workload(files, rounds)
+    size, c._DERIVE_CACHE = c._DERIVE_CACHE, 0
+    try:
+        uncached = workload(files, rounds)
+    finally:
+        c._DERIVE_CACHE = size
+    ops = 2 * files * rounds
+    print(f"{ops} operations on {files} files")
+    print(f"derivation caches off: {uncached * 1000:8.1f} ms ({uncached / ops * 1e6:.0f} us/op)")
+    print(f"derivation caches on:  {cached * 1000:8.1f} ms ({cached / ops * 1e6:.0f} us/op)")
+
+    loc = b'0123456789abcdef'
+    fast = min(timeit.repeat(lambda: memloc.MakeFromBytes(loc), number=100000, repeat=5))
+    slow = min(timeit.repeat(lambda: uuid.UUID(bytes=loc).bytes, number=100000, repeat=5))
+    print(f"MakeFromBytes: {fast * 1e4:.0f} ns (UUID round trip {slow * 1e4:.0f} ns)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+##
+## bench_import.py - Import time benchmark
+##
+## Imports a module in fresh interpreters under `python -X importtime` and
+## reports the median total import time and the modules that contribute
+## most to it, along with the wall time of the whole process compared with
+## an interpreter that imports nothing.
+##
+## Usage:  python3 bench_import.py [module] [runs]
+##
+
+import statistics
+import subprocess
+import sys
+import time
+
+
+def importtime(module: str) -> dict[str, int]:
+    """
+    Imports `module` in a fresh interpreter and returns the cumulative
+    import time in microseconds of every module it loaded.
+    """
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                            capture_output=True, text=True, check=True)
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        times[name.strip()] = int(cumulative)
+    return times
+
+def wall_time(code: str) -> float:
+    start = time.perf_counter()
+    subprocess.run([sys.executable, "-c", code], check=True)
+    return time.perf_counter() - start
+
+def main() -> None:
+    module = sys.argv[1] if len(sys.argv) > 1 else "client"
+    runs = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+
+    samples = [importtime(module) for _ in range(runs)]
+    medians = {name: statistics.median(run.get(name, 0) for run in samples)
+               for name in samples[0]}
+    print(f"import {module}: median {medians[module] / 1000:.1f} ms over {runs} runs")
+    print(f"{'module':<56} {'cumulative ms':>13}")
+    for name, micros in sorted(medians.items(), key=lambda item: -item[1])[1:16]:
+        print(f"{name:<56} {micros / 1000:>13.1f}")
+
+    baseline = statistics.median(wall_time("pass") for _ in range(runs))
+    loaded = statistics.median(wall_time(f"import {module}") for _ in range(runs))
+    print(f"process wall time: {loaded * 1000:.1f} ms "
+          f"({(loaded - baseline) * 1000:.1f} ms more than an empty interpreter)")
+
+
+if __name__ == "__main__":
+    main()
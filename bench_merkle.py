@@ -0,0 +1,89 @@
+##
+## bench_merkle.py - Chunk tree verification benchmark
+##
+## Builds files of growing size and measures what a cold 4 KB tail read
+## has to fetch and hash to verify its data, compared with re-hashing the
+## whole chunk table (what a single whole-file MAC would require).
+##
+## Usage:  python3 bench_merkle.py [largest size in MB]
+##
+
+import sys
+import time
+
+import support.crypto as crypto
+from support.dataserver import dataserver
+from support.keyserver import keyserver
+
+import client as c
+
+
+class HashCounter:
+    """
+    Wraps crypto.Hash to count calls and hashed bytes.
+    """
+    def __init__(self):
+        self.calls = 0
+        self.bytes = 0
+        self.original = crypto.Hash
+
+    def __call__(self, data: bytes) -> bytes:
+        self.calls += 1
+        self.bytes += len(data)
+        return self.original(data)
+
+    def __enter__(self):
+        crypto.Hash = self
+        return self
+
+    def __exit__(self, *exc):
+        crypto.Hash = self.original
+
+
+def main() -> None:
+    largest = int(sys.argv[1]) if len(sys.argv) > 1 else 64
+    # Small chunks give large trees without needing gigabytes of data.
+    c.CDC_MIN_SIZE, c.CDC_AVG_SIZE, c.CDC_MAX_SIZE = 2048, 4096, 8192
+
+    print(f"{'size MB':>8} {'chunks':>7} {'depth':>5} {'gets':>5} {'hashes':>6} "
+          f"{'hashed KB':>10} {'table KB':>9} {'read ms':>8}")
+    size = 1
+    while size <= largest:
+        dataserver.Clear()
+        keyserver.Clear()
+        u = c.create_user("bench", "pswd")
+        u.upload_file("f", crypto.SecureRandom(size * 2**20))
+
+        _, file_key, header_loc = u._open("f")
+        header = u._load_header(c._subkeys(file_key, "file"), header_loc)
+        nodes = list(u._walk(header.root))
+        table = sum(len(dataserver.Get(ref.loc)) for ref, _ in nodes)
+        depth, ref = 0, header.root
+        while ref is not None:
+            depth += 1
+            children = u._session.load_node(ref).children
+            ref = children[-1] if children else None
+
+        u._session.records.clear()
+        gets = 0
+        original_get = dataserver.Get
+        def counting_get(loc):
+            nonlocal gets
+            gets += 1
+            return original_get(loc)
+        dataserver.Get = counting_get
+        try:
+            with HashCounter() as hashes:
+                start = time.perf_counter()
+                u.download_range("f", size * 2**20 - 4096, 4096)
+                took = time.perf_counter() - start
+        finally:
+            dataserver.Get = original_get
+
+        print(f"{size:>8} {header.root.count:>7} {depth:>5} {gets:>5} {hashes.calls:>6} "
+              f"{hashes.bytes / 1024:>10.1f} {table / 1024:>9.1f} {took * 1000:>8.2f}")
+        size *= 4
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+##
+## bench_records.py - Metadata record benchmark
+##
+## Compares the client's __slots__ metadata records and binary encoding
+## with the nested dicts and base64-JSON (util.ObjectToBytes) they replace:
+## memory held by a session cache of N files (file entry and header per
+## file), stored size, and serialization time.  Also compares the packed
+## chunk table of one very large file with the list of chunk entry lists
+## it replaces.
+##
+## Usage:  python3 bench_records.py [number of files] [number of chunks]
+##
+
+import os
+import sys
+import time
+import tracemalloc
+
+import support.util as util
+
+import client as c
+
+
+def as_dicts(n: int) -> list:
+    """
+    Returns n (entry, header) pairs in the dict form of the old format.
+    """
+    return [({"owner": True, "key": os.urandom(16), "header": os.urandom(16), "last": None},
+             {"size": 4096 * i, "delta": os.urandom(16),
+              "root": [os.urandom(16), os.urandom(16), os.urandom(32), 4096 * i, i],
+              "log": {"key": os.urandom(16), "count": i % 16, "chain": os.urandom(32)}})
+            for i in range(n)]
+
+def as_records(n: int) -> list:
+    return [(c._OwnerEntry(os.urandom(16), os.urandom(16), None),
+             c._Header(4096 * i, os.urandom(16),
+                       c._NodeRef(os.urandom(16), os.urandom(16), os.urandom(32), 4096 * i, i),
+                       c._AppendLog(os.urandom(16), i % 16, os.urandom(32))))
+            for i in range(n)]
+
+def measure(build, encode, decode, n: int) -> tuple[int, int, float]:
+    """
+    Returns (bytes of memory held by n decoded file records, bytes stored,
+    seconds to encode and decode them all).
+    """
+    pairs = build(n)
+    start = time.perf_counter()
+    blobs = [(encode(entry), encode(header)) for entry, header in pairs]
+    tracemalloc.start()
+    decoded = [(decode[0](entry), decode[1](header)) for entry, header in blobs]
+    held = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    took = time.perf_counter() - start
+    del decoded
+    return held, sum(len(a) + len(b) for a, b in blobs), took
+
+def chunk_entries(n: int) -> list:
+    return [[os.urandom(16), 65536, os.urandom(16), os.urandom(32),
+             os.urandom(32) if i % 2 else None, os.urandom(32), "zlib"] for i in range(n)]
+
+def measure_table(encode, decode, n: int) -> tuple[int, int, float]:
+    """
+    Returns (bytes of memory held by a decoded table of n chunks, bytes
+    stored, seconds to encode, decode and walk it).
+    """
+    entries = chunk_entries(n)
+    start = time.perf_counter()
+    blob = encode(entries)
+    tracemalloc.start()
+    table = decode(blob)
+    held = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    total = sum(entry[1] for entry in table)
+    took = time.perf_counter() - start
+    assert total == 65536 * n
+    return held, len(blob), took
+
+def main() -> None:
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    chunks = int(sys.argv[2]) if len(sys.argv) > 2 else 1000000
+    rows = {
+        "dict + JSON": measure(as_dicts, util.ObjectToBytes,
+                               (util.BytesToObject, util.BytesToObject), n),
+        "records": measure(as_records, lambda record: record.to_bytes(),
+                           (c._parse_entry, c._Header.from_bytes), n),
+    }
+    print(f"{n} files (file entry + header each)")
+    print(f"{'format':<12} {'memory MB':>10} {'B/file':>8} {'stored B/file':>14} {'us/file':>8}")
+    for name, (held, stored, took) in rows.items():
+        print(f"{name:<12} {held / 2**20:>10.1f} {held // n:>8} {stored // n:>14} "
+              f"{took / n * 1e6:>8.1f}")
+
+    rows = {
+        "lists + JSON": measure_table(util.ObjectToBytes, util.BytesToObject, chunks),
+        "packed": measure_table(lambda entries: c._ChunkTable.pack(entries).to_bytes(),
+                                # copied, as decrypting a record would
+                                lambda blob: c._ChunkTable.from_bytes(bytes(memoryview(blob))),
+                                chunks),
+    }
+    print(f"\n{chunks} chunk table entries ({chunks * 65536 / 2**30:.0f} GB file)")
+    print(f"{'format':<12} {'memory MB':>10} {'B/chunk':>8} {'stored B/chunk':>14} {'us/chunk':>8}")
+    for name, (held, stored, took) in rows.items():
+        print(f"{name:<12} {held / 2**20:>10.1f} {held // chunks:>8} {stored // chunks:>14} "
+              f"{took / chunks * 1e6:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
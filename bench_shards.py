@@ -0,0 +1,64 @@
+##
+## bench_shards.py - Sharded dataserver throughput benchmark
+##
+## Measures Set/Get throughput of the in-process dataserver and of
+## ShardedDataserver with a growing number of worker processes, for single
+## calls and for bulk calls fanned out across the shards.
+##
+## Usage:  python3 bench_shards.py [values] [value size] [batch size]
+##
+
+import os
+import sys
+import time
+
+from support.dataserver import Dataserver, memloc
+from support.sharded import ShardedDataserver
+
+
+def throughput(server, locs: list, value: bytes, batch: int) -> dict[str, float]:
+    """
+    Returns operations per second for single and bulk Sets and Gets.
+    """
+    rates = {}
+    start = time.perf_counter()
+    for loc in locs:
+        server.Set(loc, value)
+    rates["Set"] = len(locs) / (time.perf_counter() - start)
+    start = time.perf_counter()
+    for loc in locs:
+        server.Get(loc)
+    rates["Get"] = len(locs) / (time.perf_counter() - start)
+    server.Clear()
+
+    if hasattr(server, "SetMany"):
+        start = time.perf_counter()
+        for i in range(0, len(locs), batch):
+            server.SetMany({loc: value for loc in locs[i:i + batch]})
+        rates["SetMany"] = len(locs) / (time.perf_counter() - start)
+        start = time.perf_counter()
+        for i in range(0, len(locs), batch):
+            server.GetMany(locs[i:i + batch])
+        rates["GetMany"] = len(locs) / (time.perf_counter() - start)
+    return rates
+
+def main() -> None:
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    size = int(sys.argv[2]) if len(sys.argv) > 2 else 1024
+    batch = int(sys.argv[3]) if len(sys.argv) > 3 else 1000
+    locs = [memloc.Make() for _ in range(count)]
+    value = os.urandom(size)
+
+    print(f"{count} values of {size} bytes, bulk batches of {batch}")
+    print(f"{'server':<12} {'Set/s':>10} {'Get/s':>10} {'SetMany/s':>10} {'GetMany/s':>10}")
+    rows = [("in-process", throughput(Dataserver(), locs, value, batch))]
+    for shards in (1, 2, 4, 8):
+        with ShardedDataserver(shards) as server:
+            rows.append((f"{shards} shards", throughput(server, locs, value, batch)))
+    for name, rates in rows:
+        print(f"{name:<12} " + " ".join(f"{rates[op]:>10.0f}" if op in rates else f"{'-':>10}"
+                                        for op in ("Set", "Get", "SetMany", "GetMany")))
+
+
+if __name__ == "__main__":
+    main()
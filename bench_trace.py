@@ -0,0 +1,218 @@
+##
+## bench_trace.py - Workload trace benchmark
+##
+## Replays a JSONL trace of client operations against the in-memory
+## dataserver and reports latency percentiles and throughput per operation
+## type.  Each trace line is one operation:
+##
+##     {"op": "create",   "user": "u0", "password": "pw"}
+##     {"op": "auth",     "user": "u0", "password": "pw"}
+##     {"op": "upload",   "user": "u0", "file": "f0", "size": 4096, "seed": 7}
+##     {"op": "append",   "user": "u0", "file": "f0", "size": 100, "seed": 8}
+##     {"op": "download", "user": "u0", "file": "f0"}
+##     {"op": "share",    "user": "u0", "file": "f0", "to": "u1"}
+##     {"op": "receive",  "user": "u1", "file": "f0", "from": "u0"}
+##     {"op": "revoke",   "user": "u0", "file": "f0", "to": "u1"}
+##
+## File contents are generated from (size, seed), so traces stay small.
+## Operations that raise DropboxError are counted as errors, not timed.
+##
+## Usage:
+##     python3 bench_trace.py                          # replay a synthetic trace
+##     python3 bench_trace.py generate [options] > trace.jsonl
+##     python3 bench_trace.py run trace.jsonl [--client dropbox_client_reference]
+##
+
+"""Replay a trace of client operations and report latency per operation."""
+
+import argparse
+import importlib
+import json
+import math
+import random
+import time
+
+import support.util as util
+from support.dataserver import dataserver
+from support.keyserver import keyserver
+
+
+OPS = ("create", "auth", "upload", "append", "download", "share", "receive", "revoke")
+
+# Relative frequency of each operation after setup in generated traces.  The
+# "recipient" operations are downloads and appends by a current recipient of
+# the file, so the shared read and write paths are exercised too.
+MIX = {"download": 30, "append": 15, "upload": 10, "share": 10, "revoke": 5, "auth": 5,
+       "recipient download": 15, "recipient append": 10}
+
+
+def generate(users: int = 8, files: int = 4, ops: int = 500, median_size: int = 64 * 1024,
+             sigma: float = 1.5, max_size: int = 4 * 2**20, seed: int = 1660) -> list[dict]:
+    """
+    Returns a valid synthetic trace: `users` users each upload `files`
+    files with log-normally distributed sizes, followed by `ops` operations
+    drawn from MIX.  Shares are always followed by the matching receive,
+    recipients only read and append to files currently shared with them,
+    and a file is never shared again with a recipient it was revoked from
+    (who still holds a file of that name, so receiving it again fails).
+    """
+    rng = random.Random(seed)
+    def size() -> int:
+        return min(max_size, int(rng.lognormvariate(math.log(median_size), sigma)))
+
+    names = [f"u{i}" for i in range(users)]
+    trace = [{"op": "create", "user": name, "password": f"pw-{name}"} for name in names]
+    owned = {name: [f"{name}-f{j}" for j in range(files)] for name in names}
+    shared = {}  # (owner, file) -> set of current recipients
+    revoked = set()  # (owner, file, recipient)
+    for name in names:
+        for filename in owned[name]:
+            trace.append({"op": "upload", "user": name, "file": filename,
+                          "size": size(), "seed": rng.randrange(2**32)})
+
+    choices, weights = zip(*MIX.items())
+    while len(trace) < users * (files + 1) + ops:
+        op = rng.choices(choices, weights)[0]
+        user = rng.choice(names)
+        filename = rng.choice(owned[user])
+        if op == "auth":
+            trace.append({"op": "auth", "user": user, "password": f"pw-{user}"})
+        elif op in ("upload", "append"):
+            trace.append({"op": op, "user": user, "file": filename,
+                          "size": size() if op == "upload" else rng.randrange(1, 4096),
+                          "seed": rng.randrange(2**32)})
+        elif op == "download":
+            trace.append({"op": "download", "user": user, "file": filename})
+        elif op == "share" and users > 1:
+            recipient = rng.choice([name for name in names if name != user])
+            if (recipient in shared.setdefault((user, filename), set())
+                    or (user, filename, recipient) in revoked):
+                continue
+            shared[(user, filename)].add(recipient)
+            trace.append({"op": "share", "user": user, "file": filename, "to": recipient})
+            trace.append({"op": "receive", "user": recipient, "file": filename, "from": user})
+        elif op.startswith("recipient ") and shared.get((user, filename)):
+            recipient = rng.choice(sorted(shared[(user, filename)]))
+            if op == "recipient append":
+                trace.append({"op": "append", "user": recipient, "file": filename,
+                              "size": rng.randrange(1, 4096), "seed": rng.randrange(2**32)})
+            else:
+                trace.append({"op": "download", "user": recipient, "file": filename})
+        elif op == "revoke" and shared.get((user, filename)):
+            recipient = rng.choice(sorted(shared[(user, filename)]))
+            shared[(user, filename)].remove(recipient)
+            revoked.add((user, filename, recipient))
+            trace.append({"op": "revoke", "user": user, "file": filename, "to": recipient})
+    return trace
+
+def load_client(name: str):
+    """
+    Imports a client module by name, exiting with a message if it cannot
+    be loaded (e.g. the reference wheel was built for another Python).
+    """
+    try:
+        return importlib.import_module(name)
+    except Exception as exc:
+        raise SystemExit(f"cannot load client module {name!r}: {exc}")
+
+def replay(client, trace: list[dict]) -> tuple[dict[str, list[float]], dict[str, int], int]:
+    """
+    Runs `trace` against `client` on empty servers.  Returns (latencies in
+    seconds per op, error count per op, file bytes moved by the trace).
+    """
+    dataserver.Clear()
+    keyserver.Clear()
+    handles = {}
+    latencies = {op: [] for op in OPS}
+    errors = {op: 0 for op in OPS}
+    moved = 0
+
+    for record in trace:
+        op = record["op"]
+        user = handles.get(record["user"])
+        if op in ("create", "auth"):
+            call = client.create_user if op == "create" else client.authenticate_user
+            args = (call, record["user"], record["password"])
+        elif op in ("upload", "append"):
+            data = random.Random(record["seed"]).randbytes(record["size"])
+            args = (getattr(user, f"{op}_file"), record["file"], data)
+            moved += len(data)
+        elif op == "download":
+            args = (user.download_file, record["file"])
+        elif op in ("share", "revoke"):
+            args = (getattr(user, f"{op}_file"), record["file"], record["to"])
+        elif op == "receive":
+            args = (user.receive_file, record["file"], record["from"])
+        else:
+            raise ValueError(f"unknown trace operation {op!r}")
+
+        start = time.perf_counter()
+        try:
+            result = args[0](*args[1:])
+        except util.DropboxError:
+            errors[op] += 1
+            continue
+        latencies[op].append(time.perf_counter() - start)
+        if op in ("create", "auth"):
+            handles[record["user"]] = result
+        elif op == "download":
+            moved += len(result)
+    return latencies, errors, moved
+
+def percentile(values: list[float], p: float) -> float:
+    """
+    Nearest-rank percentile of `values`, which must be sorted.
+    """
+    return values[max(0, math.ceil(p / 100 * len(values)) - 1)]
+
+def report(latencies: dict[str, list[float]], errors: dict[str, int]) -> str:
+    lines = [f"{'op':>9} {'count':>6} {'errors':>6} {'p50 ms':>9} {'p95 ms':>9} "
+             f"{'p99 ms':>9} {'ops/s':>9}"]
+    for op in OPS:
+        values = sorted(latencies[op])
+        if not values:
+            continue
+        lines.append(f"{op:>9} {len(values):>6} {errors[op]:>6} "
+                     f"{percentile(values, 50) * 1000:>9.2f} {percentile(values, 95) * 1000:>9.2f} "
+                     f"{percentile(values, 99) * 1000:>9.2f} {len(values) / sum(values):>9.1f}")
+    return "\n".join(lines)
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    commands = parser.add_subparsers(dest="command")
+    gen = commands.add_parser("generate", help="write a synthetic trace to stdout")
+    gen.add_argument("--users", type=int, default=8)
+    gen.add_argument("--files", type=int, default=4, help="files uploaded per user")
+    gen.add_argument("--ops", type=int, default=500, help="operations after setup")
+    gen.add_argument("--median-size", type=int, default=64 * 1024)
+    gen.add_argument("--sigma", type=float, default=1.5, help="log-normal size spread")
+    gen.add_argument("--max-size", type=int, default=4 * 2**20)
+    gen.add_argument("--seed", type=int, default=1660)
+    run = commands.add_parser("run", help="replay a trace file")
+    run.add_argument("trace")
+    run.add_argument("--client", default="client", help="client module to benchmark")
+    args = parser.parse_args()
+
+    if args.command == "generate":
+        for record in generate(args.users, args.files, args.ops, args.median_size,
+                               args.sigma, args.max_size, args.seed):
+            print(json.dumps(record))
+        return
+
+    if args.command == "run":
+        with open(args.trace) as f:
+            trace = [json.loads(line) for line in f if line.strip()]
+        client = load_client(args.client)
+    else:
+        trace, client = generate(), load_client("client")
+
+    start = time.perf_counter()
+    latencies, errors, moved = replay(client, trace)
+    took = time.perf_counter() - start
+    print(report(latencies, errors))
+    print(f"{len(trace)} ops in {took:.2f} s: {len(trace) / took:.1f} ops/s, "
+          f"{moved / took / 2**20:.2f} MB/s of file data")
+
+
+if __name__ == "__main__":
+    main()
@@ -7,6 +7,14 @@
 #import string  # Python library with useful string constants
 #import dacite  # Helpers for serializing dicts into dataclasses
 #import pymerkle # Merkle tree implementation (CS1620/CS2660 only, but still optional)
+import collections
+import contextlib
+import functools
+import math
+import struct
+import threading
+import weakref
+import zlib
 
 ## ** Support code libraries ****
 # The following imports load our support code from the "support"
@@ -23,76 +31,1589 @@ from support.keyserver import keyserver
 # first.  You are NOT permitted to use any additional cryptographic functions
 # other than those provided by crypto.py, or any filesystem/networking libraries.
 
+# Size of the pieces that append_file splits file data into.
+CHUNK_SIZE = 64 * 1024
+
+# Bytes of decrypted chunk data each account keeps in memory for repeated
+# downloads (0 disables the cache).
+CHUNK_CACHE_SIZE = 32 * 1024 * 1024
+
+# Minimum, target and maximum chunk sizes for the content-defined chunker
+# used by upload_file.
+CDC_MIN_SIZE = 16 * 1024
+CDC_AVG_SIZE = 32 * 1024
+CDC_MAX_SIZE = 128 * 1024
+
+# How chunks are compressed before being encrypted: "none", "zlib", "lzma",
+# or "auto" to use zlib unless a sample of the chunk looks incompressible.
+# Each chunk records its own codec, so this can be changed at any time.
+COMPRESSION = "auto"
+
+# Sample size and entropy (bits per byte) above which "auto" compression
+# stores a chunk as-is.
+_ENTROPY_SAMPLE = 4096
+_ENTROPY_LIMIT = 7.5
+
+# Number of derived subkeys and memlocs each session memoizes.
+_DERIVE_CACHE = 4096
+
+# Length in bytes of every HMAC tag appended by _seal.
+_TAG_LEN = 64
+
+# Length in bytes of chunk digests and chunk index references.
+_DIGEST_LEN = 32
+
+# Number of top-level records the per-user chunk index is split across, and
+# the number of entries past which a bucket is split in two by the next bit
+# of the chunk reference, which keeps the cost of updating one bounded by
+# this rather than by how much the user has stored.
+_INDEX_BUCKETS = 64
+_INDEX_BUCKET_LIMIT = 64
+
+# Maximum number of children (or chunk table entries) per chunk tree node.
+_NODE_FANOUT = 64
+
+# Number of append_file records a file's append log holds before they are
+# folded into its chunk tree.
+_LOG_LIMIT = 16
+
+# Hash chain value of an empty append log.
+_EMPTY_CHAIN = bytes(_DIGEST_LEN)
+
+# FastCDC gear table and normalized-chunking masks: a cut is harder to find
+# before CDC_AVG_SIZE and easier after it, which narrows the size spread.
+_GEAR = [int.from_bytes(crypto.Hash(bytes([i]))[:8], "big") for i in range(256)]
+_MASK_64 = (1 << 64) - 1
+_CDC_MASK_HARD = ((1 << 17) - 1) << 47
+_CDC_MASK_EASY = ((1 << 13) - 1) << 51
+
+
+## ** Storage helpers **
+
+def _derive_memloc(*parts) -> bytes:
+    """
+    Returns a deterministic memloc for a tuple of strings.  The parts are
+    serialized as a JSON list so that ("a/b", "c") and ("a", "b/c") never
+    collide.
+    """
+    return memloc.MakeFromBytes(crypto.Hash(util.ObjectToBytes(list(parts)))[:16])
+
+def _keyed_memloc(key: bytes, *parts) -> bytes:
+    """
+    Like _derive_memloc, but keyed so that only holders of `key` can compute
+    (or even recognize) the location.
+    """
+    return memloc.MakeFromBytes(crypto.HMAC(key, util.ObjectToBytes(list(parts)))[:16])
+
+def _subkeys(key: bytes, purpose: str) -> tuple[bytes, bytes]:
+    """
+    Splits a 16 byte key into an (encryption key, MAC key) pair for `purpose`.
+    """
+    return crypto.HashKDF(key, purpose + "/enc"), crypto.HashKDF(key, purpose + "/mac")
+
+def _seal(keys: tuple[bytes, bytes], loc: bytes, data: bytes) -> bytes:
+    """
+    Encrypts then MACs `data`.  The MAC also covers the memloc the blob is
+    stored at, so blobs cannot be swapped between locations.
+    """
+    enc_key, mac_key = keys
+    ciphertext = crypto.SymmetricEncrypt(enc_key, crypto.SecureRandom(16), data)
+    return ciphertext + crypto.HMAC(mac_key, loc + ciphertext)
+
+def _unseal(keys: tuple[bytes, bytes], loc: bytes, blob: bytes) -> bytes:
+    """
+    Verifies and decrypts a blob produced by _seal, raising DropboxError if it
+    has been tampered with (or was sealed under different keys).
+    """
+    enc_key, mac_key = keys
+    ciphertext, tag = blob[:-_TAG_LEN], blob[-_TAG_LEN:]
+    if len(tag) != _TAG_LEN or not crypto.HMACEqual(tag, crypto.HMAC(mac_key, loc + ciphertext)):
+        raise util.DropboxError("Integrity check failed")
+    return crypto.SymmetricDecrypt(enc_key, ciphertext)
+
+def _servers(data, keys) -> tuple:
+    """
+    Returns the (dataserver, keyserver) to use, defaulting either one left
+    as None to the support singleton.
+    """
+    return (dataserver if data is None else data), (keyserver if keys is None else keys)
+
+def _get(server, loc: bytes) -> bytes:
+    """
+    Dataserver Get that reports missing values as a DropboxError.
+    """
+    try:
+        return server.Get(loc)
+    except ValueError:
+        raise util.DropboxError("Value does not exist")
+
+def _delete(server, loc: bytes) -> None:
+    """
+    Dataserver Delete that ignores values which are already gone.
+    """
+    try:
+        server.Delete(loc)
+    except ValueError:
+        pass
+
+def _cdc_boundaries(data: bytes) -> list[tuple[int, int]]:
+    """
+    Splits `data` into content-defined (start, end) ranges with a gear rolling
+    hash, so an insertion or deletion only changes the chunks around it.
+    """
+    ranges = []
+    start, total = 0, len(data)
+    gear = _GEAR
+    while start < total:
+        end = min(start + CDC_MAX_SIZE, total)
+        if end - start > CDC_MIN_SIZE:
+            normal = min(start + CDC_AVG_SIZE, end)
+            i, h = start + CDC_MIN_SIZE, 0
+            while i < normal:
+                h = ((h << 1) + gear[data[i]]) & _MASK_64
+                i += 1
+                if not h & _CDC_MASK_HARD:
+                    end = i
+                    break
+            else:
+                while i < end:
+                    h = ((h << 1) + gear[data[i]]) & _MASK_64
+                    i += 1
+                    if not h & _CDC_MASK_EASY:
+                        end = i
+                        break
+        ranges.append((start, end))
+        start = end
+    return ranges
+
+def _entropy(data: bytes) -> float:
+    """
+    Returns the Shannon entropy of `data` in bits per byte.
+    """
+    total = len(data)
+    return -sum(n / total * math.log2(n / total) for n in collections.Counter(data).values())
+
+def _compress(data: bytes) -> tuple[str, bytes]:
+    """
+    Compresses a chunk according to COMPRESSION, returning (codec, payload).
+    Chunks that would not shrink are stored as-is.
+    """
+    codec = COMPRESSION
+    if codec == "auto":
+        sample = data[:_ENTROPY_SAMPLE]
+        codec = "zlib" if sample and _entropy(sample) < _ENTROPY_LIMIT else "none"
+    if codec == "zlib":
+        packed = zlib.compress(data)
+    elif codec == "lzma":
+        import lzma  # rarely used and slow to import
+        packed = lzma.compress(data)
+    else:
+        return "none", data
+    return (codec, packed) if len(packed) < len(data) else ("none", data)
+
+def _decompress(codec: str, payload: bytes) -> bytes:
+    if codec == "zlib":
+        try:
+            return zlib.decompress(payload)
+        except zlib.error:
+            raise util.DropboxError("Chunk cannot be decompressed")
+    if codec == "lzma":
+        import lzma
+        try:
+            return lzma.decompress(payload)
+        except lzma.LZMAError:
+            raise util.DropboxError("Chunk cannot be decompressed")
+    return payload
+
+def _put_chunk(server, data: bytes, mac: bytes, ref: "bytes | None" = None) -> tuple:
+    """
+    Compresses and encrypts `data` under a fresh key at a fresh memloc and
+    returns its chunk table entry (memloc, length, key, digest, ref, mac,
+    codec).  `ref` is the chunk's key in the uploader's chunk index (None if
+    it is not indexed), `mac` is the HMAC of its plaintext under the file's
+    delta key and `codec` is how it was compressed.  Chunks are authenticated
+    by the digest held in the (MACed) file header rather than by their own key,
+    so handing a chunk's key to someone does not let them forge it.
+    """
+    codec, payload = _compress(data)
+    loc, key = memloc.Make(), crypto.SecureRandom(16)
+    blob = crypto.SymmetricEncrypt(key, crypto.SecureRandom(16), payload)
+    server.Set(loc, blob)
+    return (loc, len(data), key, crypto.Hash(blob)[:_DIGEST_LEN], ref, mac, codec)
+
+def _read_chunk(server, entry: tuple) -> bytes:
+    """
+    Fetches, verifies, decrypts and decompresses the chunk described by a
+    chunk table entry.
+    """
+    loc, _, key, digest = entry[:4]
+    blob = _get(server, loc)
+    if not crypto.HMACEqual(crypto.Hash(blob)[:_DIGEST_LEN], digest):
+        raise util.DropboxError("Integrity check failed")
+    return _decompress(entry[6], crypto.SymmetricDecrypt(key, blob))
+
+def _new_log() -> "_AppendLog":
+    """
+    Returns an empty append log under a fresh key.
+    """
+    return _AppendLog(crypto.SecureRandom(16), 0, _EMPTY_CHAIN)
+
+def _user_exists(server, username: str) -> bool:
+    try:
+        server.Get(username + "/enc")
+        return True
+    except ValueError:
+        return False
+
+
+## ** Metadata records **
+#
+# Metadata is held in memory as small __slots__ classes rather than dicts
+# and stored in a fixed binary layout rather than base64-JSON, so sessions
+# caching many files stay compact and records are cheap to (de)serialize.
+# Records are only parsed once their MAC, digest or signature has been
+# checked, but parsers still report malformed input as a DropboxError.
+
+def _unpack(layout: struct.Struct, data: bytes, offset: int = 0) -> tuple:
+    try:
+        return layout.unpack_from(data, offset)
+    except struct.error:
+        raise util.DropboxError("Malformed record")
+
+def _pack_name(name: "str | None") -> bytes:
+    """
+    Encodes an optional username as the last field of a record.
+    """
+    return b"" if name is None else b"\x01" + name.encode()
+
+def _unpack_name(data: bytes) -> "str | None":
+    try:
+        return data[1:].decode() if data else None
+    except UnicodeDecodeError:
+        raise util.DropboxError("Malformed record")
+
+class _Record:
+    """
+    Base for metadata records: the constructor sets the __slots__ fields in
+    order, and records compare field by field.
+    """
+    __slots__ = ()
+
+    def __init__(self, *values) -> None:
+        if len(values) != len(self.__slots__):
+            raise TypeError(f"{type(self).__name__} takes {len(self.__slots__)} fields")
+        for name, value in zip(self.__slots__, values):
+            setattr(self, name, value)
+
+    def replace(self, **changes) -> "_Record":
+        """
+        Returns a copy with some fields changed.
+        """
+        return type(self)(*(changes.get(name, getattr(self, name)) for name in self.__slots__))
+
+    def __eq__(self, other: object) -> bool:
+        return type(self) is type(other) and all(
+            getattr(self, name) == getattr(other, name) for name in self.__slots__)
+
+    def __repr__(self) -> str:
+        fields = ", ".join(f"{name}={getattr(self, name)!r}" for name in self.__slots__)
+        return f"{type(self).__name__}({fields})"
+
+class _NodeRef(_Record):
+    """
+    Reference to a chunk tree node: its memloc, key and ciphertext digest,
+    and the number of bytes and chunks below it.
+    """
+    __slots__ = ("loc", "key", "digest", "size", "count")
+    LAYOUT = struct.Struct(">16s16s32sQQ")
+
+    def to_bytes(self) -> bytes:
+        return self.LAYOUT.pack(self.loc, self.key, self.digest, self.size, self.count)
+
+    @classmethod
+    def from_bytes(cls, data: bytes, offset: int = 0) -> "_NodeRef":
+        return cls(*_unpack(cls.LAYOUT, data, offset))
+
+# Compression codecs by their number in packed chunk entries, and the flag
+# marking entries whose chunk is not in the uploader's chunk index.
+_CODECS = ("none", "zlib", "lzma")
+_NO_REF = 0x80
+
+def _codec(number: int) -> str:
+    try:
+        return _CODECS[number]
+    except IndexError:
+        raise util.DropboxError("Malformed record")
+
+class _ChunkTable:
+    """
+    Chunk table packed into one bytes object of fixed-width entries, so a
+    file with millions of chunks holds a single buffer rather than millions
+    of lists.  Slices share the buffer through a memoryview, and entries are
+    only unpacked on access, as (memloc, length, key, digest, ref, mac,
+    codec) tuples where `ref` is the chunk's key in the uploader's chunk
+    index, or None.
+    """
+    __slots__ = ("data",)
+    ENTRY = struct.Struct(">16sI16s32s32s32sB")
+
+    def __init__(self, data: "bytes | memoryview" = b"") -> None:
+        if len(data) % self.ENTRY.size:
+            raise util.DropboxError("Malformed record")
+        self.data = data
+
+    @classmethod
+    def pack(cls, entries) -> "_ChunkTable":
+        pack, no_ref = cls.ENTRY.pack, bytes(_DIGEST_LEN)
+        return cls(b"".join(
+            pack(loc, length, key, digest, ref or no_ref, mac,
+                 _CODECS.index(codec) | (_NO_REF if ref is None else 0))
+            for loc, length, key, digest, ref, mac, codec in entries))
+
+    @classmethod
+    def join(cls, tables) -> "_ChunkTable":
+        return cls(b"".join(table.data for table in tables))
+
+    @staticmethod
+    def _entry(fields: tuple) -> tuple:
+        loc, length, key, digest, ref, mac, flags = fields
+        return (loc, length, key, digest, None if flags & _NO_REF else ref, mac,
+                _codec(flags & ~_NO_REF))
+
+    def __len__(self) -> int:
+        return len(self.data) // self.ENTRY.size
+
+    def __iter__(self):
+        return map(self._entry, self.ENTRY.iter_unpack(self.data))
+
+    def __getitem__(self, index: "int | slice") -> "tuple | _ChunkTable":
+        width = self.ENTRY.size
+        if isinstance(index, slice):
+            start, stop, _ = index.indices(len(self))
+            return _ChunkTable(memoryview(self.data)[start * width:max(start, stop) * width])
+        if not -len(self) <= index < len(self):
+            raise IndexError("chunk table index out of range")
+        return self._entry(self.ENTRY.unpack_from(self.data, (index % len(self)) * width))
+
+    def __add__(self, other: "_ChunkTable") -> "_ChunkTable":
+        return _ChunkTable.join((self, other))
+
+    def locs(self) -> tuple[bytes, ...]:
+        view, width = memoryview(self.data), self.ENTRY.size
+        return tuple(bytes(view[i:i + 16]) for i in range(0, len(view), width))
+
+    def total(self) -> int:
+        """
+        Returns the number of plaintext bytes in the table's chunks.
+        """
+        return sum(fields[1] for fields in self.ENTRY.iter_unpack(self.data))
+
+    def to_bytes(self) -> bytes:
+        return bytes(self.data)
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "_ChunkTable":
+        return cls(data)
+
+def _leaf_chunks(nodes) -> _ChunkTable:
+    """
+    Joins the chunk tables of the leaves among (reference, node) pairs.
+    """
+    return _ChunkTable.join(node.chunks for _, node in nodes if node.chunks is not None)
+
+class _IndexBucket(dict):
+    """
+    One bucket of a user's chunk index: {ref: [memloc, length, key, digest,
+    reference count, codec]}, stored as packed fixed-width entries.  A
+    bucket that has been split holds no entries and is stored as b"S".
+    """
+    ENTRY = struct.Struct(">32s16sI16s32sIB")
+    split = False
+
+    def to_bytes(self) -> bytes:
+        if self.split:
+            return b"S"
+        pack = self.ENTRY.pack
+        return b"".join(pack(ref, loc, length, key, digest, count, _CODECS.index(codec))
+                        for ref, (loc, length, key, digest, count, codec) in self.items())
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "_IndexBucket":
+        if data == b"S":
+            bucket = cls()
+            bucket.split = True
+            return bucket
+        if len(data) % cls.ENTRY.size:
+            raise util.DropboxError("Malformed record")
+        return cls((ref, [loc, length, key, digest, count, _codec(codec)])
+                   for ref, loc, length, key, digest, count, codec in cls.ENTRY.iter_unpack(data))
+
+class _TreeNode(_Record):
+    """
+    Chunk tree node: a leaf holds a chunk table, an internal node holds
+    child references.  The other field is None.
+    """
+    __slots__ = ("chunks", "children")
+
+    def to_bytes(self) -> bytes:
+        if self.children is None:
+            return b"L" + self.chunks.to_bytes()
+        return b"N" + b"".join(ref.to_bytes() for ref in self.children)
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "_TreeNode":
+        if data[:1] == b"L":
+            return cls(_ChunkTable(memoryview(data)[1:]), None)
+        width = _NodeRef.LAYOUT.size
+        if data[:1] != b"N" or (len(data) - 1) % width:
+            raise util.DropboxError("Malformed record")
+        return cls(None, [_NodeRef.from_bytes(data, i) for i in range(1, len(data), width)])
+
+class _AppendLog(_Record):
+    """
+    State of a file's append log: the key its records are derived from, how
+    many there are, and the hash chain over their digests.
+    """
+    __slots__ = ("key", "count", "chain")
+
+class _Header(_Record):
+    """
+    File header: size, delta MAC key, chunk tree root (None for an empty
+    tree) and append log.
+    """
+    __slots__ = ("size", "delta", "root", "log")
+    LAYOUT = struct.Struct(">Q16s16sQ32s?")
+
+    def to_bytes(self) -> bytes:
+        fields = self.LAYOUT.pack(self.size, self.delta, self.log.key, self.log.count,
+                                  self.log.chain, self.root is not None)
+        return fields + (self.root.to_bytes() if self.root is not None else b"")
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "_Header":
+        size, delta, log_key, count, chain, has_root = _unpack(cls.LAYOUT, data)
+        root = _NodeRef.from_bytes(data, cls.LAYOUT.size) if has_root else None
+        return cls(size, delta, root, _AppendLog(log_key, count, chain))
+
+class _OwnerEntry(_Record):
+    """
+    File entry for a file the user owns: the file key, the header memloc and
+    the most recent direct recipient, which heads the list of share records.
+    """
+    __slots__ = ("key", "header", "last")
+    owner = True
+    LAYOUT = struct.Struct(">?16s16s")
+
+    def to_bytes(self) -> bytes:
+        return self.LAYOUT.pack(True, self.key, self.header) + _pack_name(self.last)
+
+class _RecipientEntry(_Record):
+    """
+    File entry for a file shared with the user: the access node to open it
+    through.
+    """
+    __slots__ = ("node", "node_key")
+    owner = False
+
+    def to_bytes(self) -> bytes:
+        return _OwnerEntry.LAYOUT.pack(False, self.node, self.node_key)
+
+def _parse_entry(data: bytes) -> "_OwnerEntry | _RecipientEntry":
+    owner, first, second = _unpack(_OwnerEntry.LAYOUT, data)
+    if owner:
+        return _OwnerEntry(first, second, _unpack_name(data[_OwnerEntry.LAYOUT.size:]))
+    return _RecipientEntry(first, second)
+
+class _ShareRecord(_Record):
+    """
+    An owner's record of a direct recipient: the access node handed to them
+    and the previous recipient in the share list.
+    """
+    __slots__ = ("node", "node_key", "prev")
+    LAYOUT = struct.Struct(">16s16s")
+
+    def to_bytes(self) -> bytes:
+        return self.LAYOUT.pack(self.node, self.node_key) + _pack_name(self.prev)
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "_ShareRecord":
+        node, node_key = _unpack(cls.LAYOUT, data)
+        return cls(node, node_key, _unpack_name(data[cls.LAYOUT.size:]))
+
+class _AccessNode(_Record):
+    """
+    Node of the share tree: the file key and header memloc, as seen by one
+    direct recipient and everyone they shared with.
+    """
+    __slots__ = ("key", "header")
+    LAYOUT = struct.Struct(">16s16s")
+
+    def to_bytes(self) -> bytes:
+        return self.LAYOUT.pack(self.key, self.header)
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "_AccessNode":
+        return cls(*_unpack(cls.LAYOUT, data))
+
+class _Invitation(_Record):
+    """
+    Signed, public-key encrypted pointer to an access node.
+    """
+    __slots__ = ("ct", "sig")
+    LAYOUT = struct.Struct(">HH")
+
+    def to_bytes(self) -> bytes:
+        return self.LAYOUT.pack(len(self.ct), len(self.sig)) + self.ct + self.sig
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "_Invitation":
+        ct_len, sig_len = _unpack(cls.LAYOUT, data)
+        start = cls.LAYOUT.size
+        if len(data) != start + ct_len + sig_len:
+            raise util.DropboxError("Malformed record")
+        return cls(data[start:start + ct_len], data[start + ct_len:])
+
+
+## ** Sessions **
+
+class _ChunkCache:
+    """
+    Byte-budgeted LRU of verified, decompressed chunks keyed by (memloc,
+    plaintext MAC).  Chunks are only looked up through entries of a chunk
+    table that was itself just verified from the file header down, so a
+    stale or tampered header never yields cached data it does not name,
+    and revoked users fail before reaching their chunk table.
+    """
+    def __init__(self, server) -> None:
+        self.server = server
+        self.lock = threading.Lock()
+        self.chunks = collections.OrderedDict()  # type: collections.OrderedDict[tuple[bytes, bytes], bytes]
+        self.size = 0
+
+    def read(self, entry: tuple) -> bytes:
+        key = (entry[0], entry[5])
+        with self.lock:
+            data = self.chunks.get(key)
+            if data is not None:
+                self.chunks.move_to_end(key)
+                return data
+        data = _read_chunk(self.server, entry)
+        budget = CHUNK_CACHE_SIZE
+        with self.lock:
+            if len(data) <= budget and key not in self.chunks:
+                self.chunks[key] = data
+                self.size += len(data)
+            while self.size > budget:
+                self.size -= len(self.chunks.popitem(last=False)[1])
+        return data
+
+class _Session:
+    """
+    Decrypted state for one account, shared by every live User handle for
+    that username on the same dataserver in this process.  Every server call
+    made for the account goes to the session's `dataserver` and `keyserver`.
+
+    Besides the account's key material, a session caches the parsed
+    metadata records (file entries, access nodes and file headers) keyed by
+    memloc.  A cached record is only reused if the dataserver still holds the
+    exact blob it was decrypted from under the same MAC key, so writes made
+    by any other handle, user or process invalidate the entry on the next
+    read.  Chunk tree nodes are immutable and named by their digest, so a
+    cached node is reused without going back to the dataserver at all.
+    Chunk contents are cached separately in `chunks`, and `subkeys` and
+    `keyed_memloc` memoize key and memloc derivations for the account's
+    files, which are repeated on every operation.
+
+    Inside batch(), rewrites of existing file headers and chunk index
+    buckets are held (unsealed) in `pending` and deletes in `doomed`, and
+    both are applied when the outermost batch exits.  New records and every other
+    kind of record are still written through, so each header version other
+    sessions can read only refers to data that is already stored, and
+    nothing an old header refers to is deleted before the new one lands.
+    Each pending record remembers the stored blob it replaces; if someone
+    else rewrote the record meanwhile, flush() drops it rather than undo
+    their write (see flush).
+    """
+    def __init__(self, username: str, record_blob: bytes, auth_key: bytes,
+                 decrypt_key: crypto.AsymmetricDecryptKey,
+                 sign_key: crypto.SignatureSignKey, base_key: bytes,
+                 dataserver, keyserver) -> None:
+        self.username = username
+        self.dataserver = dataserver
+        self.keyserver = keyserver
+        self.record_blob = record_blob
+        self.auth_key = auth_key
+        self.decrypt_key = decrypt_key
+        self.sign_key = sign_key
+        self.entry_keys = _subkeys(base_key, "entry")
+        self.index_keys = _subkeys(base_key, "index")
+        self.locate_key = crypto.HashKDF(base_key, "locate")
+        self.dedup_key = crypto.HashKDF(base_key, "dedup")
+        self.subkeys = functools.lru_cache(_DERIVE_CACHE)(_subkeys)
+        self.keyed_memloc = functools.lru_cache(_DERIVE_CACHE)(_keyed_memloc)
+        self.refs = 0
+        self.lock = threading.RLock()
+        self.records = {}  # type: dict[bytes, tuple[bytes, bytes, object]]
+        self.chunks = _ChunkCache(dataserver)
+        self.batch_depth = 0
+        self.pending = {}  # type: dict[bytes, tuple[tuple[bytes, bytes], object, bytes]]
+        self.doomed = set()  # type: set[bytes]
+
+    def memloc(self, *parts) -> bytes:
+        """
+        Returns the account's keyed memloc for `parts`.
+        """
+        return self.keyed_memloc(self.locate_key, *parts)
+
+    def load(self, keys: tuple[bytes, bytes], loc: bytes, parse,
+             missing_ok: bool = False) -> object:
+        """
+        Fetches and verifies the metadata record at `loc` and deserializes it
+        with `parse`.  If `missing_ok` is set, returns None when nothing is
+        stored there.
+        """
+        with self.lock:
+            if loc in self.pending:
+                return self.records[loc][2]
+            doomed = loc in self.doomed
+        try:
+            if doomed:
+                raise ValueError("Deleted in the current batch")
+            blob = self.dataserver.Get(loc)
+        except ValueError:
+            if missing_ok:
+                return None
+            raise util.DropboxError("Value does not exist")
+        with self.lock:
+            cached = self.records.get(loc)
+            if cached is not None and cached[0] == keys[1] and cached[1] == blob:
+                return cached[2]
+        obj = parse(_unseal(keys, loc, blob))
+        with self.lock:
+            self.records[loc] = (keys[1], blob, obj)
+        return obj
+
+    def store(self, keys: tuple[bytes, bytes], loc: bytes, obj: object,
+              defer: bool = False) -> None:
+        """
+        Serializes, seals and writes a metadata record, updating the cache.
+        With `defer`, a record that already exists is only written when the
+        current batch ends.
+        """
+        with self.lock:
+            self.doomed.discard(loc)
+            if defer and self.batch_depth > 0 and loc in self.records:
+                base = self.pending[loc][2] if loc in self.pending else self.records[loc][1]
+                self.pending[loc] = (keys, obj, base)
+                self.records[loc] = (keys[1], None, obj)
+                return
+            self.pending.pop(loc, None)
+        blob = _seal(keys, loc, obj.to_bytes())
+        self.dataserver.Set(loc, blob)
+        with self.lock:
+            self.records[loc] = (keys[1], blob, obj)
+
+    def load_node(self, ref: _NodeRef) -> _TreeNode:
+        """
+        Fetches, verifies and decrypts the chunk tree node `ref` points to.
+        """
+        loc, key, digest = ref.loc, ref.key, ref.digest
+        with self.lock:
+            cached = self.records.get(loc)
+            if cached is not None and cached[0] == digest:
+                return cached[2]
+        blob = _get(self.dataserver, loc)
+        if not crypto.HMACEqual(crypto.Hash(blob)[:_DIGEST_LEN], digest):
+            raise util.DropboxError("Integrity check failed")
+        node = _TreeNode.from_bytes(crypto.SymmetricDecrypt(key, blob))
+        with self.lock:
+            self.records[loc] = (digest, blob, node)
+        return node
+
+    def store_node(self, node: _TreeNode) -> _NodeRef:
+        """
+        Encrypts a chunk tree node under a fresh key at a fresh memloc and
+        returns the reference its parent holds.
+        """
+        if node.children is None:
+            size, count = node.chunks.total(), len(node.chunks)
+        else:
+            size = sum(ref.size for ref in node.children)
+            count = sum(ref.count for ref in node.children)
+        loc, key = memloc.Make(), crypto.SecureRandom(16)
+        blob = crypto.SymmetricEncrypt(key, crypto.SecureRandom(16), node.to_bytes())
+        self.dataserver.Set(loc, blob)
+        digest = crypto.Hash(blob)[:_DIGEST_LEN]
+        with self.lock:
+            self.records[loc] = (digest, blob, node)
+        return _NodeRef(loc, key, digest, size, count)
+
+    def load_log(self, enc_key: bytes, locs: list[bytes], chain: bytes) -> list["_ChunkTable"]:
+        """
+        Fetches the append log records at `locs`, checks their digests against
+        the hash chain value `chain` and only then decrypts them.  Log records
+        are written once, so cached copies are reused without refetching.
+        """
+        fetched, value = [], _EMPTY_CHAIN
+        for loc in locs:
+            with self.lock:
+                cached = self.records.get(loc)
+            if cached is None:
+                blob = _get(self.dataserver, loc)
+                cached = (crypto.Hash(blob)[:_DIGEST_LEN], blob, None)
+            fetched.append((loc, cached))
+            value = crypto.Hash(value + cached[0])[:_DIGEST_LEN]
+        if not crypto.HMACEqual(value, chain):
+            raise util.DropboxError("Integrity check failed")
+
+        records = []
+        for loc, (digest, blob, record) in fetched:
+            if record is None:
+                record = _ChunkTable.from_bytes(crypto.SymmetricDecrypt(enc_key, blob))
+                with self.lock:
+                    self.records[loc] = (digest, blob, record)
+            records.append(record)
+        return records
+
+    def store_log_record(self, enc_key: bytes, loc: bytes, record: "_ChunkTable") -> bytes:
+        """
+        Encrypts and writes an append log record, returning its digest.
+        """
+        blob = crypto.SymmetricEncrypt(enc_key, crypto.SecureRandom(16), record.to_bytes())
+        self.dataserver.Set(loc, blob)
+        digest = crypto.Hash(blob)[:_DIGEST_LEN]
+        with self.lock:
+            self.records[loc] = (digest, blob, record)
+        return digest
+
+    def delete(self, loc: bytes) -> None:
+        """
+        Deletes a record and drops the cached copy of it.  Inside a batch the
+        delete is applied when the batch ends.
+        """
+        with self.lock:
+            self.records.pop(loc, None)
+            self.pending.pop(loc, None)
+            if self.batch_depth > 0:
+                self.doomed.add(loc)
+                return
+        _delete(self.dataserver, loc)
+
+    @contextlib.contextmanager
+    def batch(self):
+        with self.lock:
+            self.batch_depth += 1
+        try:
+            yield
+        finally:
+            with self.lock:
+                self.batch_depth -= 1
+                outer = self.batch_depth == 0
+            if outer:
+                self.flush()
+
+    def flush(self) -> None:
+        """
+        Writes the pending records, then applies the pending deletes.
+
+        A pending record whose stored copy changed since the batch first
+        deferred it (e.g. a recipient appended to the file, overwriting the
+        batch's log record at the same index) is not written, since the
+        batch's version may refer to data that is gone.  The other pending
+        records are still written, but the deletes are skipped, because the
+        other writer's version may still use what the batch replaced, and
+        DropboxError is raised once the cache has been dropped.
+        """
+        with self.lock:
+            pending, doomed = self.pending, self.doomed
+            self.pending, self.doomed = {}, set()
+        conflicts = False
+        for loc, (keys, obj, base) in pending.items():
+            try:
+                current = self.dataserver.Get(loc)
+            except ValueError:
+                current = None
+            if current != base:
+                conflicts = True
+                continue
+            blob = _seal(keys, loc, obj.to_bytes())
+            self.dataserver.Set(loc, blob)
+            with self.lock:
+                if self.records.get(loc, (None, None, None))[2] is obj:
+                    self.records[loc] = (keys[1], blob, obj)
+        if conflicts:
+            with self.lock:
+                self.records.clear()
+            raise util.DropboxError("File changed by someone else during the batch")
+        for loc in doomed:
+            _delete(self.dataserver, loc)
+
+_sessions = {}  # type: dict[tuple[object, str], _Session]
+_sessions_lock = threading.Lock()
+
+def _acquire_session(session: _Session) -> _Session:
+    with _sessions_lock:
+        session.refs += 1
+        _sessions[(session.dataserver, session.username)] = session
+    return session
+
+def _release_session(session: _Session) -> None:
+    key = (session.dataserver, session.username)
+    with _sessions_lock:
+        session.refs -= 1
+        if session.refs <= 0 and _sessions.get(key) is session:
+            del _sessions[key]
+
+def _live_session(server, username: str) -> "_Session | None":
+    with _sessions_lock:
+        return _sessions.get((server, username))
+
+
 class User:
-    def __init__(self) -> None:
+    def __init__(self, session: _Session) -> None:
         """
         Class constructor for the `User` class.
 
         You are free to add fields to the User class by changing the definition
         of this function.
         """
-        pass
+        self.username = session.username
+        self._session = _acquire_session(session)
+        weakref.finalize(self, _release_session, session)
+
+    @property
+    def last_op_stats(self) -> "support.instrument.OpStats | None":
+        """
+        Dataserver, keyserver and crypto calls made by the most recent
+        operation on this handle, e.g. `u.last_op_stats.sets`.  Only
+        recorded while a support.instrument.Recorder for this module is
+        active; None otherwise.
+        """
+        import support.instrument as instrument  # only needed when instrumenting
+        return instrument.last_op_stats(self)
+
+    def batch(self):
+        """
+        Context manager that coalesces file header and chunk index rewrites
+        made by this account (through any handle) until it exits, e.g.
+
+            with u.batch():
+                for line in lines:
+                    u.append_file("log", line)
+
+        writes the header once instead of once per append.  Handles of this
+        account see their own writes immediately; other users and processes
+        see each file as it was before the batch until it exits.  If someone
+        else writes to a file the batch changed before it exits, the batch's
+        changes to that file are dropped and exiting raises DropboxError.
+        Batches may be nested; the outermost one flushes.
+        """
+        return self._session.batch()
+
+    ## ** File resolution helpers **
+
+    def _entry_loc(self, filename: str) -> bytes:
+        return self._session.memloc("entry", filename)
+
+    def _load_entry(self, filename: str) -> "_OwnerEntry | _RecipientEntry | None":
+        return self._session.load(self._session.entry_keys, self._entry_loc(filename),
+                                  _parse_entry, missing_ok=True)
+
+    def _store_entry(self, filename: str, entry: "_OwnerEntry | _RecipientEntry") -> None:
+        self._session.store(self._session.entry_keys, self._entry_loc(filename), entry)
+
+    def _share_loc(self, filename: str, recipient: str) -> bytes:
+        return self._session.memloc("share", filename, recipient)
+
+    def _load_share(self, filename: str, recipient: "str | None") -> "_ShareRecord | None":
+        """
+        Returns the owner's share record for a direct recipient of
+        `filename`, or None.  The records form a list through `prev` starting
+        at the file entry's `last` recipient, so sharing costs the same
+        however many recipients there already are.
+        """
+        if recipient is None:
+            return None
+        return self._session.load(self._session.entry_keys, self._share_loc(filename, recipient),
+                                  _ShareRecord.from_bytes, missing_ok=True)
+
+    def _shares(self, filename: str, entry: _OwnerEntry) -> list[tuple[str, _ShareRecord]]:
+        """
+        Returns (recipient, share record) for every direct recipient of an
+        owned file, most recent first.
+        """
+        shares, recipient = [], entry.last
+        while recipient is not None:
+            share = self._load_share(filename, recipient)
+            if share is None:
+                raise util.DropboxError("Share list is corrupted")
+            shares.append((recipient, share))
+            recipient = share.prev
+        return shares
+
+    def _open(self, filename: str) -> tuple["_OwnerEntry | _RecipientEntry", bytes, bytes]:
+        """
+        Resolves `filename` to (entry, file key, header memloc), raising
+        DropboxError if the file does not exist or access was revoked.
+        """
+        entry = self._load_entry(filename)
+        if entry is None:
+            raise util.DropboxError("File does not exist")
+        if entry.owner:
+            return entry, entry.key, entry.header
+        node = self._session.load(self._session.subkeys(entry.node_key, "node"), entry.node,
+                                  _AccessNode.from_bytes)
+        return entry, node.key, node.header
+
+    def _load_header(self, keys: tuple[bytes, bytes], loc: bytes) -> _Header:
+        return self._session.load(keys, loc, _Header.from_bytes)
+
+    def _load_bucket(self, buckets: dict, depth: int, prefix: int) -> _IndexBucket:
+        """
+        Returns the (writable copy of the) chunk index bucket for refs whose
+        first `depth` bits are `prefix`, loading it into `buckets` on first use.
+        """
+        if (depth, prefix) not in buckets:
+            loc = self._session.memloc("chunk-index", depth, prefix)
+            bucket = self._session.load(self._session.index_keys, loc, _IndexBucket.from_bytes,
+                                        missing_ok=True)
+            copy = _IndexBucket((k, list(v)) for k, v in (bucket or {}).items())
+            copy.split = bucket is not None and bucket.split
+            buckets[(depth, prefix)] = copy
+        return buckets[(depth, prefix)]
+
+    def _index_bucket(self, buckets: dict, ref: bytes) -> dict:
+        """
+        Returns the chunk index bucket holding `ref`, following splits down
+        from the top-level bucket.
+        """
+        bits = int.from_bytes(ref[:4], "big")
+        depth = _INDEX_BUCKETS.bit_length() - 1
+        bucket = self._load_bucket(buckets, depth, bits >> (32 - depth))
+        while bucket.split:
+            depth += 1
+            bucket = self._load_bucket(buckets, depth, bits >> (32 - depth))
+        return bucket
+
+    def _index_locs(self) -> list[bytes]:
+        """
+        Returns the memlocs of every bucket of this user's chunk index.
+        """
+        buckets, locs = {}, []
+        todo = [(_INDEX_BUCKETS.bit_length() - 1, prefix) for prefix in range(_INDEX_BUCKETS)]
+        while todo:
+            depth, prefix = todo.pop()
+            locs.append(self._session.memloc("chunk-index", depth, prefix))
+            if self._load_bucket(buckets, depth, prefix).split:
+                todo += [(depth + 1, prefix * 2), (depth + 1, prefix * 2 + 1)]
+        return locs
+
+    def _store_buckets(self, buckets: dict) -> None:
+        """
+        Writes back the buckets in `buckets`, splitting ones that have grown
+        past _INDEX_BUCKET_LIMIT entries.
+        """
+        todo = [(key, bucket) for key, bucket in buckets.items() if not bucket.split]
+        while todo:
+            (depth, prefix), bucket = todo.pop()
+            if len(bucket) > _INDEX_BUCKET_LIMIT and depth < 32:
+                halves = _IndexBucket(), _IndexBucket()
+                for ref, known in bucket.items():
+                    halves[int.from_bytes(ref[:4], "big") >> (31 - depth) & 1][ref] = known
+                todo += [((depth + 1, prefix * 2 + i), half) for i, half in enumerate(halves)]
+                bucket = _IndexBucket()
+                bucket.split = True
+            loc = self._session.memloc("chunk-index", depth, prefix)
+            self._session.store(self._session.index_keys, loc, bucket, defer=True)
+
+    def _dedup_chunks(self, buckets: dict, delta_key: bytes, data: bytes,
+                      previous: "_ChunkTable | tuple" = ()) -> _ChunkTable:
+        """
+        Splits `data` with the content-defined chunker and returns its chunk
+        table.  Chunks whose plaintext MAC matches an entry of `previous` (the
+        table being overwritten) are carried over as-is.  Other chunks this
+        user has stored before, in any file, are looked up in the chunk index
+        by the HMAC of their plaintext; a hit on a chunk of `previous` (whose
+        MAC is stale after revoke_file rotated the delta key) also counts as
+        carrying it over.  Only the remaining chunks are encrypted and stored.
+        """
+        by_mac, by_loc = {}, {}
+        for number, entry in enumerate(previous):
+            by_mac.setdefault(entry[5], []).append(number)
+            by_loc.setdefault(entry[0], []).append(number)
+        used = set()
+
+        def carry(numbers: list) -> "int | None":
+            while numbers:
+                number = numbers.pop()
+                if number not in used:
+                    used.add(number)
+                    return number
+            return None
+
+        chunks = []
+        for start, end in _cdc_boundaries(data):
+            piece = data[start:end]
+            mac = crypto.HMAC(delta_key, piece)[:_DIGEST_LEN]
+            number = carry(by_mac.get(mac, []))
+            if number is not None:
+                chunks.append(previous[number])
+                continue
+            ref = crypto.HMAC(self._session.dedup_key, piece)[:_DIGEST_LEN]
+            bucket = self._index_bucket(buckets, ref)
+            known = bucket.get(ref)
+            if known is None:
+                entry = _put_chunk(self._session.dataserver, piece, mac, ref)
+                bucket[ref] = [*entry[:4], 1, entry[6]]
+            else:
+                if carry(by_loc.get(known[0], [])) is None:
+                    known[4] += 1
+                entry = (*known[:4], ref, mac, known[5])
+            chunks.append(entry)
+        return _ChunkTable.pack(chunks)
+
+    def _release_chunks(self, buckets: dict, chunks: "_ChunkTable | list") -> None:
+        """
+        Drops one reference to every chunk in a chunk table, deleting chunks
+        nothing refers to any more.  Indexed chunks that belong to another
+        user's index (e.g. a recipient overwrote the owner's file) are left in
+        place since only that user can update their reference counts.
+        """
+        for entry in chunks:
+            loc, ref = entry[0], entry[4]
+            if ref is None:
+                self._session.delete(loc)
+                continue
+            bucket = self._index_bucket(buckets, ref)
+            known = bucket.get(ref)
+            if known is not None and known[0] == loc:
+                known[4] -= 1
+                if known[4] <= 0:
+                    del bucket[ref]
+                    self._session.delete(loc)
+
+    ## ** Chunk tree helpers **
+    #
+    # A file's chunk table is a Merkle tree.  Leaves hold up to _NODE_FANOUT
+    # chunk table entries, internal nodes hold up to _NODE_FANOUT child
+    # references, and every reference carries the digest of the child's
+    # ciphertext.  The file header only holds the root reference, so reaching
+    # and verifying any chunk costs one node per level.  Nodes are never
+    # modified in place: writers build new nodes and then swap the root.
+
+    def _build_tree(self, chunks: _ChunkTable, reuse: "dict | None" = None) -> "_NodeRef | None":
+        """
+        Builds a tree over a chunk table and returns its root reference.
+        Leaves whose chunks match a leaf in `reuse` (keyed by the tuple of
+        their chunk memlocs) are shared instead of being written again.
+        """
+        leaves = []
+        for start in range(0, len(chunks), _NODE_FANOUT):
+            page = chunks[start:start + _NODE_FANOUT]
+            ref = (reuse or {}).get(page.locs())
+            leaves.append(ref or self._session.store_node(_TreeNode(page, None)))
+        return self._build_levels(leaves)
+
+    def _build_levels(self, refs: list) -> "_NodeRef | None":
+        while len(refs) > 1:
+            refs = [self._session.store_node(_TreeNode(None, refs[i:i + _NODE_FANOUT]))
+                    for i in range(0, len(refs), _NODE_FANOUT)]
+        return refs[0] if refs else None
+
+    def _walk(self, ref: "_NodeRef | None"):
+        """
+        Yields (reference, node) for every node of a tree, parents first.
+        """
+        if ref is None:
+            return
+        node = self._session.load_node(ref)
+        yield ref, node
+        for child in node.children or ():
+            yield from self._walk(child)
+
+    def _tree_chunks(self, root: "_NodeRef | None") -> _ChunkTable:
+        return _leaf_chunks(self._walk(root))
+
+    def _tree_range(self, ref: _NodeRef, base: int, lo: int, hi: int, out: list) -> list:
+        """
+        Collects (file offset, entry) for every chunk below `ref` that
+        overlaps [lo, hi), given that the subtree starts at offset `base`.
+        Subtrees outside the range are skipped using the sizes in the
+        references, so only the nodes on the way to the range are fetched.
+        """
+        node = self._session.load_node(ref)
+        for item in node.chunks or ():
+            if base < hi and base + item[1] > lo:
+                out.append((base, item))
+            base += item[1]
+        for child in node.children or ():
+            if base < hi and base + child.size > lo:
+                self._tree_range(child, base, lo, hi, out)
+            base += child.size
+        return out
+
+    def _append_path(self, ref: _NodeRef, chunks: _ChunkTable, stale: list) -> list:
+        """
+        Rebuilds the rightmost path below `ref` with `chunks` added at the end
+        and returns the references that replace `ref` (more than one if the
+        node overflowed).  Replaced nodes are added to `stale`.
+        """
+        node = self._session.load_node(ref)
+        stale.append(ref.loc)
+        leaf = node.children is None
+        if leaf:
+            items = node.chunks + chunks
+        else:
+            items = node.children[:-1] + self._append_path(node.children[-1], chunks, stale)
+        pages = [items[i:i + _NODE_FANOUT] for i in range(0, len(items), _NODE_FANOUT)]
+        return [self._session.store_node(_TreeNode(page, None) if leaf else _TreeNode(None, page))
+                for page in pages]
+
+    ## ** Append log helpers **
+    #
+    # append_file does not touch the chunk tree.  Each call stores its chunk
+    # table entries as one record of the header's append log and extends a
+    # hash chain over the records' digests, so the integrity state is updated
+    # in time proportional to the appended data rather than to the file.
+    # Once the log holds _LOG_LIMIT records it is folded into the tree.
+
+    def _log_locs(self, log: _AppendLog) -> list[bytes]:
+        _, locate_key = self._session.subkeys(log.key, "log")
+        return [self._session.keyed_memloc(locate_key, "log", index) for index in range(log.count)]
+
+    def _log_chunks(self, log: _AppendLog) -> _ChunkTable:
+        """
+        Returns the chunk table entries in an append log, checking its records
+        against the hash chain in the header.
+        """
+        enc_key, _ = self._session.subkeys(log.key, "log")
+        return _ChunkTable.join(self._session.load_log(enc_key, self._log_locs(log), log.chain))
+
+    def _extend_log(self, log: _AppendLog, chunks: _ChunkTable) -> _AppendLog:
+        enc_key, locate_key = self._session.subkeys(log.key, "log")
+        loc = self._session.keyed_memloc(locate_key, "log", log.count)
+        digest = self._session.store_log_record(enc_key, loc, chunks)
+        return log.replace(count=log.count + 1,
+                           chain=crypto.Hash(log.chain + digest)[:_DIGEST_LEN])
+
+    def _fold_log(self, header: _Header, stale: list) -> _Header:
+        """
+        Returns `header` with its append log moved into the chunk tree and a
+        fresh, empty log.  Replaced nodes and log records are added to `stale`.
+        """
+        chunks = self._log_chunks(header.log)
+        root = header.root
+        if chunks and root is None:
+            root = self._build_tree(chunks)
+        elif chunks:
+            root = self._build_levels(self._append_path(root, chunks, stale))
+        stale.extend(self._log_locs(header.log))
+        return header.replace(root=root, log=_new_log())
+
+    def _retire_table(self, buckets: dict, old: _Header, nodes: list, old_chunks: _ChunkTable,
+                      root: "_NodeRef | None", chunks: _ChunkTable) -> None:
+        """
+        Cleans up after the chunk table of header `old` (whose tree `nodes`
+        and chunks `old_chunks` were read beforehand) was replaced by the
+        tree at `root` over `chunks`: deletes nodes and log records that are
+        no longer used and releases chunks that were not carried over (each
+        occurrence of a memloc in `chunks` keeps one occurrence in
+        `old_chunks`).
+        """
+        kept_nodes = {ref.loc for ref, _ in self._walk(root)}
+        for ref, _ in nodes:
+            if ref.loc not in kept_nodes:
+                self._session.delete(ref.loc)
+        for loc in self._log_locs(old.log):
+            self._session.delete(loc)
+        kept = collections.Counter(chunks.locs())
+        released = []
+        for entry in old_chunks:
+            if kept[entry[0]] > 0:
+                kept[entry[0]] -= 1
+            else:
+                released.append(entry)
+        self._release_chunks(buckets, released)
+
+    def _file_chunks(self, header: _Header) -> _ChunkTable:
+        return self._tree_chunks(header.root) + self._log_chunks(header.log)
+
+    ## ** Public API **
 
     def upload_file(self, filename: str, data: bytes) -> None:
         """
         The specification for this function is at:
         https://brown-csci1660.github.io/dropbox-wiki/client-api/storage/upload-file.html
         """
-        # TODO: Implement
-        raise util.DropboxError("Not Implemented")
+        buckets = {}
+        if self._load_entry(filename) is None:
+            file_key = crypto.SecureRandom(16)
+            header_loc = memloc.Make()
+            delta_key = crypto.SecureRandom(16)
+            root = self._build_tree(self._dedup_chunks(buckets, delta_key, data))
+            self._session.store(self._session.subkeys(file_key, "file"), header_loc,
+                                _Header(len(data), delta_key, root, _new_log()))
+            self._store_entry(filename, _OwnerEntry(file_key, header_loc, None))
+            self._store_buckets(buckets)
+            return
+
+        # Overwrite in place: only chunks that differ from the current
+        # contents are written, so small edits to big files stay cheap.
+        _, file_key, header_loc = self._open(filename)
+        keys = self._session.subkeys(file_key, "file")
+        old = self._load_header(keys, header_loc)
+        nodes = list(self._walk(old.root))
+        old_chunks = _leaf_chunks(nodes) + self._log_chunks(old.log)
+        leaves = {node.chunks.locs(): ref for ref, node in nodes if node.chunks is not None}
+
+        chunks = self._dedup_chunks(buckets, old.delta, data, old_chunks)
+        root = self._build_tree(chunks, leaves)
+        self._session.store(keys, header_loc, old.replace(size=len(data), root=root,
+                                                          log=_new_log()), defer=True)
+
+        self._retire_table(buckets, old, nodes, old_chunks, root, chunks)
+        self._store_buckets(buckets)
 
     def download_file(self, filename: str) -> bytes:
         """
         The specification for this function is at:
         https://brown-csci1660.github.io/dropbox-wiki/client-api/storage/download-file.html
         """
-        # TODO: Implement
-        raise util.DropboxError("Not Implemented")
+        _, file_key, header_loc = self._open(filename)
+        header = self._load_header(self._session.subkeys(file_key, "file"), header_loc)
+        return b"".join(map(self._session.chunks.read, self._file_chunks(header)))
+
+    def download_range(self, filename: str, offset: int, length: int) -> bytes:
+        """
+        Returns `length` bytes of `filename` starting at byte `offset`, or
+        fewer if the file ends first.  Only the chunks that overlap the range,
+        and the chunk tree nodes leading to them, are fetched and verified.
+        """
+        if offset < 0 or length < 0:
+            raise util.DropboxError("Offset and length must be non-negative")
+        _, file_key, header_loc = self._open(filename)
+        header = self._load_header(self._session.subkeys(file_key, "file"), header_loc)
+        end = min(offset + length, header.size)
+        if offset >= end:
+            return b""
+
+        root, hits = header.root, []
+        base = root.size if root is not None else 0
+        if offset < base:
+            self._tree_range(root, 0, offset, end, hits)
+        if end > base:
+            for entry in self._log_chunks(header.log):
+                if base >= end:
+                    break
+                if base + entry[1] > offset:
+                    hits.append((base, entry))
+                base += entry[1]
+        data = b"".join(self._session.chunks.read(entry) for _, entry in hits)
+        skip = offset - hits[0][0]
+        return data[skip:skip + end - offset]
 
     def append_file(self, filename: str, data: bytes) -> None:
         """
         The specification for this function is at:
         https://brown-csci1660.github.io/dropbox-wiki/client-api/storage/append-file.html
         """
-        # TODO: Implement
-        raise util.DropboxError("Not Implemented")
+        _, file_key, header_loc = self._open(filename)
+        keys = self._session.subkeys(file_key, "file")
+        header = self._load_header(keys, header_loc)
+        added = []
+        for start in range(0, len(data), CHUNK_SIZE):
+            piece = data[start:start + CHUNK_SIZE]
+            added.append(_put_chunk(self._session.dataserver, piece,
+                                    crypto.HMAC(header.delta, piece)[:_DIGEST_LEN]))
+        if not added:
+            return
+
+        stale = []
+        if header.log.count >= _LOG_LIMIT:
+            header = self._fold_log(header, stale)
+        log = self._extend_log(header.log, _ChunkTable.pack(added))
+        self._session.store(keys, header_loc, header.replace(size=header.size + len(data), log=log),
+                            defer=True)
+        for loc in stale:
+            self._session.delete(loc)
+
+    def compact_file(self, filename: str) -> None:
+        """
+        Merges runs of small chunks of `filename`, such as those left behind by
+        many append_file calls, into chunks of about CHUNK_SIZE bytes, so that
+        downloads need fewer Gets, decryptions and digest checks.  Chunks that
+        are already large are left alone.  The new chunk tree is built next to
+        the old one and swapped in with a single header write.
+        """
+        _, file_key, header_loc = self._open(filename)
+        keys = self._session.subkeys(file_key, "file")
+        header = self._load_header(keys, header_loc)
+        nodes = list(self._walk(header.root))
+        old_chunks = _leaf_chunks(nodes) + self._log_chunks(header.log)
+
+        chunks, run, run_size = [], [], 0
+        for entry in [*old_chunks, None]:
+            if entry is not None and entry[1] < CHUNK_SIZE // 2:
+                run.append(entry)
+                run_size += entry[1]
+                if run_size < CHUNK_SIZE:
+                    continue
+            if len(run) == 1:
+                chunks.append(run[0])
+            elif run:
+                data = b"".join(map(self._session.chunks.read, run))
+                for start in range(0, len(data), CHUNK_SIZE):
+                    piece = data[start:start + CHUNK_SIZE]
+                    chunks.append(_put_chunk(self._session.dataserver, piece,
+                                             crypto.HMAC(header.delta, piece)[:_DIGEST_LEN]))
+            run, run_size = [], 0
+            if entry is not None and entry[1] >= CHUNK_SIZE // 2:
+                chunks.append(entry)
+        if len(chunks) == len(old_chunks):
+            return
+
+        chunks = _ChunkTable.pack(chunks)
+        leaves = {node.chunks.locs(): ref for ref, node in nodes if node.chunks is not None}
+        root = self._build_tree(chunks, leaves)
+        old_nodes = {ref.loc for ref, _ in nodes}
+
+        # The dataserver has no compare-and-swap, so make sure nobody wrote
+        # the file while it was being compacted before swapping the root.
+        if self._load_header(keys, header_loc) != header:
+            for ref, _ in self._walk(root):
+                if ref.loc not in old_nodes:
+                    self._session.delete(ref.loc)
+            old_locs = set(old_chunks.locs())
+            for loc in chunks.locs():
+                if loc not in old_locs:
+                    _delete(self._session.dataserver, loc)
+            raise util.DropboxError("File changed during compaction")
+        self._session.store(keys, header_loc, header.replace(root=root, log=_new_log()),
+                            defer=True)
+
+        buckets = {}
+        self._retire_table(buckets, header, nodes, old_chunks, root, chunks)
+        self._store_buckets(buckets)
 
     def share_file(self, filename: str, recipient: str) -> None:
         """
         The specification for this function is at:
         https://brown-csci1660.github.io/dropbox-wiki/client-api/sharing/share-file.html
         """
-        # TODO: Implement
-        raise util.DropboxError("Not Implemented")
+        if not _user_exists(self._session.keyserver, recipient):
+            raise util.DropboxError("Recipient does not exist")
+        entry, file_key, header_loc = self._open(filename)
+
+        share = self._load_share(filename, recipient) if entry.owner else None
+        if share is not None:
+            node_loc, node_key = share.node, share.node_key
+        elif entry.owner:
+            node_loc, node_key = memloc.Make(), crypto.SecureRandom(16)
+            self._session.store(self._session.subkeys(node_key, "node"), node_loc,
+                                _AccessNode(file_key, header_loc))
+            self._session.store(self._session.entry_keys, self._share_loc(filename, recipient),
+                                _ShareRecord(node_loc, node_key, entry.last))
+            self._store_entry(filename, entry.replace(last=recipient))
+        else:
+            # Everyone below a direct recipient of the owner shares that
+            # recipient's access node, so revoking it cuts off the subtree.
+            node_loc, node_key = entry.node, entry.node_key
+
+        invite_loc = _derive_memloc("invite", self.username, recipient, filename)
+        ciphertext = crypto.AsymmetricEncrypt(self._session.keyserver.Get(recipient + "/enc"),
+                                              node_loc + node_key)
+        signature = crypto.SignatureSign(self._session.sign_key, invite_loc + ciphertext)
+        self._session.dataserver.Set(invite_loc, _Invitation(ciphertext, signature).to_bytes())
 
     def receive_file(self, filename: str, sender: str) -> None:
         """
         The specification for this function is at:
         https://brown-csci1660.github.io/dropbox-wiki/client-api/sharing/receive-file.html
         """
-        # TODO: Implement
-        raise util.DropboxError("Not Implemented")
+        if not _user_exists(self._session.keyserver, sender):
+            raise util.DropboxError("Sender does not exist")
+        if self._load_entry(filename) is not None:
+            raise util.DropboxError("File already exists")
+
+        invite_loc = _derive_memloc("invite", sender, self.username, filename)
+        try:
+            invite = _Invitation.from_bytes(_get(self._session.dataserver, invite_loc))
+        except util.DropboxError:
+            raise util.DropboxError("Malformed invitation")
+        ciphertext, signature = invite.ct, invite.sig
+        if not crypto.SignatureVerify(self._session.keyserver.Get(sender + "/sig"),
+                                      invite_loc + ciphertext, signature):
+            raise util.DropboxError("Invitation signature is invalid")
+        try:
+            payload = crypto.AsymmetricDecrypt(self._session.decrypt_key, ciphertext)
+        except ValueError:
+            raise util.DropboxError("Invitation cannot be decrypted")
+
+        node_loc, node_key = payload[:16], payload[16:]
+        keys = self._session.subkeys(node_key, "node")
+        self._session.load(keys, node_loc, _AccessNode.from_bytes)
+        self._store_entry(filename, _RecipientEntry(node_loc, node_key))
 
     def revoke_file(self, filename: str, old_recipient: str) -> None:
         """
         The specification for this function is at:
         https://brown-csci1660.github.io/dropbox-wiki/client-api/sharing/revoke-file.html
         """
-        # TODO: Implement
-        raise util.DropboxError("Not Implemented")
+        entry, file_key, header_loc = self._open(filename)
+        if not entry.owner or self._load_share(filename, old_recipient) is None:
+            raise util.DropboxError("File is not shared with that user")
+
+        # Move the header under a fresh key and location that the revoked
+        # subtree never learns.  Chunks are authenticated by the digests in
+        # the header, so they can stay where they are: the revoked users could
+        # already read them, and everything written from now on uses keys
+        # they never see.
+        # The delta key is rotated too, so the revoked users cannot test
+        # guesses of future contents against the plaintext MACs.
+        # The append log is folded into the tree first since its records are
+        # encrypted under a key the revoked users know.
+        stale = []
+        header = self._load_header(self._session.subkeys(file_key, "file"), header_loc)
+        header = self._fold_log(header, stale)
+        new_key, new_header_loc = crypto.SecureRandom(16), memloc.Make()
+        self._session.store(self._session.subkeys(new_key, "file"), new_header_loc,
+                            header.replace(delta=crypto.SecureRandom(16)))
+
+        # Unlink the revoked recipient's share record from the list.
+        shares = self._shares(filename, entry)
+        names = [recipient for recipient, _ in shares]
+        at = names.index(old_recipient)
+        revoked = shares.pop(at)[1]
+        last = entry.last
+        if at == 0:
+            last = revoked.prev
+        else:
+            after, share = shares[at - 1]
+            self._session.store(self._session.entry_keys, self._share_loc(filename, after),
+                                share.replace(prev=revoked.prev))
+        for _, share in shares:
+            self._session.store(self._session.subkeys(share.node_key, "node"), share.node,
+                                _AccessNode(new_key, new_header_loc))
+        self._store_entry(filename, entry.replace(key=new_key, header=new_header_loc, last=last))
+
+        self._session.delete(revoked.node)
+        self._session.delete(self._share_loc(filename, old_recipient))
+        self._session.delete(header_loc)
+        for loc in stale:
+            self._session.delete(loc)
+
+    ## ** Storage accounting **
+
+    def storage_map(self, *filenames: str) -> dict[bytes, tuple[str, str, int]]:
+        """
+        Returns {memloc: (filename, kind, plaintext bytes)} for every value
+        this user can attribute: their user record and chunk index ("-"),
+        and for each of `filenames` its entry, share records, access nodes,
+        invitations, header, tree nodes, log records and chunks.  The header
+        carries the file's size; chunks shared between files are attributed
+        to the first one.  Used by support.storage to explain GetMap().
+        """
+        result = {}
+        def add(loc: bytes, filename: str, kind: str, size: int = 0) -> None:
+            result.setdefault(loc, (filename, kind, size))
+
+        add(_derive_memloc("user", self.username), "-", "user")
+        for loc in self._index_locs():
+            add(loc, "-", "index")
+
+        for filename in filenames:
+            entry, file_key, header_loc = self._open(filename)
+            add(self._entry_loc(filename), filename, "entry")
+            if entry.owner:
+                for recipient, share in self._shares(filename, entry):
+                    add(self._share_loc(filename, recipient), filename, "share")
+                    add(share.node, filename, "node")
+                    add(_derive_memloc("invite", self.username, recipient, filename),
+                        filename, "invite")
+            else:
+                add(entry.node, filename, "node")
+
+            header = self._load_header(self._session.subkeys(file_key, "file"), header_loc)
+            add(header_loc, filename, "header", header.size)
+            for ref, _ in self._walk(header.root):
+                add(ref.loc, filename, "tree")
+            for loc in self._log_locs(header.log):
+                add(loc, filename, "log")
+            for chunk in self._file_chunks(header):
+                add(chunk[0], filename, "chunk")
+        return result
+
+
+## ** Authentication **
 
-def create_user(username: str, password: str) -> User:
+def _user_record(username: str, password: str) -> tuple[bytes, tuple[bytes, bytes]]:
+    """
+    Returns the memloc of a user's record and the password-derived keys that
+    seal it.
+    """
+    loc = _derive_memloc("user", username)
+    salt = crypto.Hash(util.ObjectToBytes(["salt", username]))[:16]
+    root = crypto.PasswordKDF(password, salt, 16)
+    return loc, _subkeys(root, "user")
+
+def create_user(username: str, password: str, dataserver=None, keyserver=None) -> User:
     """
     The specification for this function is at:
     https://brown-csci1660.github.io/dropbox-wiki/client-api/authentication/create-user.html
+
+    `dataserver` and `keyserver` default to the support singletons; the
+    returned user keeps using the servers it was created on.
     """
-    # TODO: Implement
-    raise util.DropboxError("Not Implemented")
+    dataserver, keyserver = _servers(dataserver, keyserver)
+    if not username:
+        raise util.DropboxError("Username cannot be empty")
+    if _user_exists(keyserver, username):
+        raise util.DropboxError("User already exists")
+
+    encrypt_key, decrypt_key = crypto.AsymmetricKeyGen()
+    verify_key, sign_key = crypto.SignatureKeyGen()
+    base_key = crypto.SecureRandom(16)
+    try:
+        keyserver.Set(username + "/enc", encrypt_key)
+        keyserver.Set(username + "/sig", verify_key)
+    except ValueError:
+        raise util.DropboxError("User already exists")
 
-def authenticate_user(username: str, password: str) -> User:
+    loc, keys = _user_record(username, password)
+    blob = _seal(keys, loc, util.ObjectToBytes({
+        "decrypt_key": bytes(decrypt_key),
+        "sign_key": bytes(sign_key),
+        "base_key": base_key,
+    }))
+    dataserver.Set(loc, blob)
+    return User(_Session(username, blob, keys[1], decrypt_key, sign_key, base_key,
+                         dataserver, keyserver))
+
+def authenticate_user(username: str, password: str, dataserver=None, keyserver=None) -> User:
     """
     The specification for this function is at:
     https://brown-csci1660.github.io/dropbox-wiki/client-api/authentication/authenticate-user.html
+
+    `dataserver` and `keyserver` are as for create_user.
     """
-    # TODO: Implement
-    raise util.DropboxError("Not Implemented")
+    dataserver, keyserver = _servers(dataserver, keyserver)
+    if not _user_exists(keyserver, username):
+        raise util.DropboxError("User does not exist")
+    loc, keys = _user_record(username, password)
+    blob = _get(dataserver, loc)
+
+    # Another handle for this account is live: skip decrypting and parsing
+    # the private keys if the password and the stored record both match.
+    session = _live_session(dataserver, username)
+    if (session is not None and session.keyserver is keyserver
+            and session.record_blob == blob and crypto.HMACEqual(session.auth_key, keys[1])):
+        return User(session)
+
+    try:
+        record = util.BytesToObject(_unseal(keys, loc, blob))
+        decrypt_key = crypto.AsymmetricDecryptKey.from_bytes(record["decrypt_key"])
+        sign_key = crypto.SignatureSignKey.from_bytes(record["sign_key"])
+    except (ValueError, KeyError, TypeError):
+        raise util.DropboxError("Invalid username or password")
+    return User(_Session(username, blob, keys[1], decrypt_key, sign_key, record["base_key"],
+                         dataserver, keyserver))
@@ -0,0 +1,117 @@
+##
+## run_tests.py - Parallel unittest runner
+##
+## Loads the given test files, deals their test cases out to worker
+## processes and reports the combined result with the wall time.  Each
+## worker has its own dataserver and keyserver singletons, so tests never
+## see each other's state.  Cases are dealt in file order, one class at a
+## time, so setUpClass still runs once per worker that gets a class.
+##
+## With --pool, workers share prebuilt users through that file (see
+## support/fixtures.py), which is created on the first run.
+##
+## With --threads, each worker also runs its cases across that many
+## threads.  This is only safe for files whose tests give themselves their
+## own servers in setUp (test_functionality.py does, through
+## UserPool.isolate); tests that use the singletons must run one at a time.
+##
+## Usage:
+##     python3 run_tests.py [-j WORKERS] [--threads N] [--pool FILE] test_file.py ...
+##
+
+import argparse
+import concurrent.futures
+import io
+import os
+import sys
+import time
+import unittest
+
+
+def _ids(suite) -> list[str]:
+    if isinstance(suite, unittest.TestCase):
+        return [suite.id()]
+    return [test_id for test in suite for test_id in _ids(test)]
+
+def collect(files: list[str]) -> list[str]:
+    """
+    Returns the ids of every test case in `files`, in file order.
+    """
+    loader = unittest.defaultTestLoader
+    return [test_id for name in files
+            for test_id in _ids(loader.loadTestsFromName(os.path.splitext(name)[0]))]
+
+def run_part(test_ids: list[str], threads: int = 1) -> tuple[int, list, list, int, str]:
+    """
+    Runs `test_ids` in this process, across `threads` threads, and returns
+    (tests run, failures, errors, skipped, output) with failures and errors
+    as (id, traceback).
+    """
+    if threads > 1:
+        parts = deal(test_ids, threads)
+        with concurrent.futures.ThreadPoolExecutor(threads) as pool:
+            results = list(pool.map(run_part, parts))
+        return (sum(result[0] for result in results),
+                [item for result in results for item in result[1]],
+                [item for result in results for item in result[2]],
+                sum(result[3] for result in results),
+                "".join(result[4] for result in results))
+    stream = io.StringIO()
+    suite = unittest.defaultTestLoader.loadTestsFromNames(test_ids)
+    result = unittest.TextTestRunner(stream=stream, verbosity=0).run(suite)
+    return (result.testsRun,
+            [(test.id(), trace) for test, trace in result.failures],
+            [(test.id(), trace) for test, trace in result.errors],
+            len(result.skipped), stream.getvalue())
+
+def deal(test_ids: list[str], workers: int) -> list[list[str]]:
+    """
+    Splits `test_ids` into about four parts per worker, keeping each test
+    class's cases together and in order.
+    """
+    classes = {}
+    for test_id in test_ids:
+        classes.setdefault(test_id.rsplit(".", 1)[0], []).append(test_id)
+    size = max(1, len(test_ids) // (workers * 4))
+    parts = []
+    for cases in classes.values():
+        parts += [cases[i:i + size] for i in range(0, len(cases), size)]
+    return parts
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Run unittest files across processes.")
+    parser.add_argument("files", nargs="+")
+    parser.add_argument("-j", "--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--threads", type=int, default=1,
+                        help="threads per worker, for tests with their own servers")
+    parser.add_argument("--pool", help="user pool file shared by the workers")
+    args = parser.parse_args()
+    if args.pool:
+        os.environ["DROPBOX_USER_POOL"] = args.pool
+
+    start = time.perf_counter()
+    test_ids = collect(args.files)
+    if args.workers > 1:
+        # Executor workers are not daemonic, so tests may start processes.
+        with concurrent.futures.ProcessPoolExecutor(args.workers) as pool:
+            parts = deal(test_ids, args.workers)
+            results = list(pool.map(run_part, parts, [args.threads] * len(parts)))
+    else:
+        results = [run_part(test_ids, args.threads)]
+    took = time.perf_counter() - start
+
+    run = sum(result[0] for result in results)
+    problems = [(kind, item) for result in results
+                for kind, items in (("FAIL", result[1]), ("ERROR", result[2])) for item in items]
+    skipped = sum(result[3] for result in results)
+    for kind, (test_id, trace) in problems:
+        print("=" * 70, f"{kind}: {test_id}", "-" * 70, trace, sep="\n")
+    print(f"Ran {run} tests in {took:.3f}s with {args.workers} worker(s)"
+          + (f" of {args.threads} threads" if args.threads > 1 else "")
+          + (f", {skipped} skipped" if skipped else ""))
+    print("FAILED" if problems else "OK")
+    sys.exit(1 if problems else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -11,8 +11,10 @@
 ##
 
 
-from cryptography.hazmat.primitives.asymmetric import rsa, padding
-from cryptography.hazmat.primitives import hashes, hmac, serialization, constant_time
+# The RSA and key serialization modules are the slowest part of importing
+# this file and are only needed for the asymmetric functions, so they are
+# imported inside the functions that use them.
+from cryptography.hazmat.primitives import hashes, hmac, constant_time
 from cryptography.hazmat.primitives import padding as sym_padding
 from cryptography.hazmat.primitives.kdf.hkdf import HKDF
 from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
@@ -45,10 +47,12 @@ class AsmPublicKey:
 
     @classmethod
     def from_bytes(cls, byte_repr):
+        from cryptography.hazmat.primitives import serialization
         pub_key = serialization.load_pem_public_key(byte_repr)
         return cls(pub_key)
 
     def __str__(self):
+        from cryptography.hazmat.primitives import serialization
         pem = self.libPubKey.public_bytes(
             encoding=serialization.Encoding.PEM,
             format=serialization.PublicFormat.SubjectPublicKeyInfo,
@@ -56,6 +60,7 @@ class AsmPublicKey:
         return pem.decode('utf-8')
 
     def __bytes__(self):
+        from cryptography.hazmat.primitives import serialization
         pem = self.libPubKey.public_bytes(
             encoding=serialization.Encoding.PEM,
             format=serialization.PublicFormat.SubjectPublicKeyInfo,
@@ -75,10 +80,12 @@ class AsmPrivateKey:
 
     @classmethod
     def from_bytes(cls, byte_repr):
+        from cryptography.hazmat.primitives import serialization
         private_key = serialization.load_pem_private_key(byte_repr, password=None)
         return cls(private_key)
 
     def __str__(self):
+        from cryptography.hazmat.primitives import serialization
         pem = self.libPrivKey.private_bytes(
             encoding=serialization.Encoding.PEM,
             format=serialization.PrivateFormat.PKCS8,
@@ -87,6 +94,7 @@ class AsmPrivateKey:
         return pem.decode('utf-8')
 
     def __bytes__(self):
+        from cryptography.hazmat.primitives import serialization
         pem = self.libPrivKey.private_bytes(
             encoding=serialization.Encoding.PEM,
             format=serialization.PrivateFormat.PKCS8,
@@ -119,6 +127,7 @@ def AsymmetricKeyGen() -> tuple[AsymmetricEncryptKey, AsymmetricDecryptKey]:
      Params: None
      Returns: (Public) Asymmetric Encryption Key, (Private) Asymmetric Decryption Key
     """
+    from cryptography.hazmat.primitives.asymmetric import rsa
     private_key = rsa.generate_private_key(public_exponent=65537,key_size=2048)
     public_key = private_key.public_key()
 
@@ -136,6 +145,7 @@ def AsymmetricEncrypt(EncryptionKey: AsymmetricEncryptKey, plaintext: bytes) ->
         check_type(EncryptionKey, AsymmetricEncryptKey, "EncryptionKey", "AsymmetricEncrypt")
         check_type(plaintext, bytes, "plaintext", "AsymmetricEncrypt")
 
+        from cryptography.hazmat.primitives.asymmetric import padding
         c_bytes = EncryptionKey.libPubKey.encrypt(plaintext, padding.OAEP(
             mgf=padding.MGF1(algorithm=hashes.SHA512()),
             algorithm=hashes.SHA512(),
@@ -156,6 +166,7 @@ def AsymmetricDecrypt(DecryptionKey: AsymmetricDecryptKey, ciphertext: bytes) ->
     check_type(DecryptionKey, AsymmetricDecryptKey, "DecryptionKey", "AsymmetricDecrypt")
     check_type(ciphertext, bytes, "ciphertext", "AsymmetricDecrypt")
 
+    from cryptography.hazmat.primitives.asymmetric import padding
     plaintext = DecryptionKey.libPrivKey.decrypt(
         ciphertext,
         padding.OAEP(
@@ -173,6 +184,7 @@ def SignatureKeyGen() -> tuple[SignatureVerifyKey, SignatureSignKey]:
     Params: None
     Returns: (Public) Verifying Key, (Private) Signing Key
     """
+    from cryptography.hazmat.primitives.asymmetric import rsa
     private_key = rsa.generate_private_key(public_exponent=65537,key_size=2048)
     public_key = private_key.public_key()
 
@@ -190,6 +202,7 @@ def SignatureSign(SigningKey: SignatureSignKey, data: bytes) -> bytes:
     check_type(SigningKey, SignatureSignKey, "SigningKey", "SignatureSign")
     check_type(data, bytes, "data", "SignatureSign")
 
+    from cryptography.hazmat.primitives.asymmetric import padding
     signature = SigningKey.libPrivKey.sign(
         data,
         padding.PSS(
@@ -213,6 +226,7 @@ def SignatureVerify(VerifyKey: SignatureVerifyKey, data: bytes, signature: bytes
     check_type(VerifyKey, SignatureVerifyKey, "VerifyKey", "SignatureVerify")
     check_type(data, bytes, "data", "SignatureVerify")
 
+    from cryptography.hazmat.primitives.asymmetric import padding
     try:
         VerifyKey.libPubKey.verify(
             signature,
@@ -32,14 +32,22 @@ class Memloc:
         Params: 16 bytes to convert to memloc
         Returns: memloc (bytes)
         """
+        if type(bytes16) is bytes and len(bytes16) == 16:
+            return bytes16  # already what the UUID round trip would return
         return uuid.UUID(bytes=bytes16).bytes
 
 class Dataserver:
     """
     Dataserver implementation.
+
+    Besides the values, the dataserver keeps a running total of the bytes
+    stored (see Stats) so that capacity can be monitored without walking
+    GetMap().  Calls are counted by support.instrument, not here, to keep
+    Set, Get and Delete cheap.
     """
     def __init__(self):
         self.data = {}  # type: dict[bytes, bytes]
+        self.stored_bytes = 0
 
     def _validate(self, memloc: bytes) -> None:
         """
@@ -59,14 +67,19 @@ class Dataserver:
 
         Returns: None
         """
-        self._validate(memloc)
-        if not isinstance(val, bytes):
-            print(
-                f"ERROR: Datasever can only store raw bytes! You gave val of type {type(val)}. Please serialize to bytes."
-            )
-            raise ValueError
+        # Exact types take the fast path; anything else gets the full checks.
+        if type(memloc) is not bytes or len(memloc) != 16 or type(val) is not bytes:
+            self._validate(memloc)
+            if not isinstance(val, bytes):
+                print(
+                    f"ERROR: Datasever can only store raw bytes! You gave val of type {type(val)}. Please serialize to bytes."
+                )
+                raise ValueError
 
-        self.data[memloc] = val
+        data = self.data
+        old = data.get(memloc)
+        data[memloc] = val
+        self.stored_bytes += len(val) if old is None else len(val) - len(old)
 
     def Get(self, memloc: bytes) -> bytes:
         """
@@ -77,11 +90,12 @@ class Dataserver:
 
         Returns: val or raises ValueError
         """
-        self._validate(memloc)
-        if memloc in self.data:
+        if type(memloc) is not bytes or len(memloc) != 16:
+            self._validate(memloc)
+        try:
             return self.data[memloc]
-        else:
-            raise ValueError("ValDoesNotExist")
+        except KeyError:
+            raise ValueError("ValDoesNotExist") from None
 
     def Delete(self, memloc: bytes) -> None:
         """
@@ -92,11 +106,12 @@ class Dataserver:
 
         Returns: None or raises ValueError
         """
-        self._validate(memloc)
-        if memloc in self.data:
-            del self.data[memloc]
-        else:
+        if type(memloc) is not bytes or len(memloc) != 16:
+            self._validate(memloc)
+        val = self.data.pop(memloc, None)
+        if val is None:
             raise ValueError("ValDoesNotExist")
+        self.stored_bytes -= len(val)
 
     ##################################################################
     # NOTE: the following functions are provided for testing ONLY--you
@@ -114,11 +129,23 @@ class Dataserver:
         """
         return self.data
 
+    def Stats(self) -> dict:
+        """
+        Return the number of values and bytes stored.  Only kept in step with
+        changes made through Set and Delete, not with changes made to the
+        GetMap() dictionary directly.
+
+        Params: None
+        Returns: dict
+        """
+        return {"entries": len(self.data), "stored_bytes": self.stored_bytes}
+
     def Clear(self):
         """
         Delete the entire server contents
         """
         self.data = {}
+        self.stored_bytes = 0
 
 dataserver = Dataserver()
 memloc = Memloc()
@@ -0,0 +1,198 @@
+##
+## fixtures.py - Prebuilt users for tests and benchmarks
+##
+## Creating a user costs two RSA-2048 key generations, which dominates the
+## runtime of most tests.  A UserPool creates each (username, password)
+## account once, for real, and remembers the dataserver and keyserver
+## entries that creation produced.  Later requests for the same account
+## copy those entries into the servers and authenticate, so every test
+## still starts from cleared servers and gets a working, independent user.
+## The pool also keeps one handle per account alive, which lets clients
+## that share state between handles of an account (as client.py does) skip
+## loading the private keys again on every authentication.
+##
+## The pool can be saved to and loaded from a file (see support.snapshot),
+## so separate processes, such as parallel test workers, share one set of
+## prebuilt users.  The file records a digest of the client module's source
+## and is ignored (and rebuilt) once the client changes, so accounts stored
+## by older code never leak into a test run.
+##
+## If the client's create_user and authenticate_user take `dataserver` and
+## `keyserver` arguments (as client.py's do), isolate() gives the calling
+## thread its own server instances and points the pool at them, so tests
+## running in different threads of one process never see each other's
+## state.  Otherwise the pool uses the support singletons.
+##
+## Usage:
+##
+##     import client
+##     from support.fixtures import UserPool
+##
+##     pool = UserPool(client, "users.pool")
+##     create_user = pool.create_user   # in place of client.create_user
+##     authenticate_user = pool.authenticate_user
+##
+##     dataserver, keyserver = pool.isolate()   # in each test's setUp
+##
+
+import hashlib
+import inspect
+import os
+import struct
+import threading
+
+from support import snapshot
+from support.dataserver import Dataserver, dataserver
+from support.keyserver import Keyserver, keyserver
+
+# Pool file header: magic and the digest of the client's source, followed by
+# a per-user header: username, password and snapshot lengths.
+_MAGIC = b"DBXPOOL1"
+_HEADER = struct.Struct(">8s32s")
+_ENTRY = struct.Struct(">HHI")
+
+
+def _client_digest(client) -> bytes:
+    """
+    Returns a digest of the file `client` was loaded from (or of its name if
+    it has none).
+    """
+    path = getattr(client, "__file__", None)
+    if path is None:
+        return hashlib.sha256(client.__name__.encode()).digest()
+    with open(path, "rb") as f:
+        return hashlib.sha256(f.read()).digest()
+
+
+class UserPool:
+    """
+    Accounts of `client` (a client module) created once and installed on
+    demand.  If `path` is given the pool starts from that file, if it
+    exists, and adds every account it builds to it.
+    """
+    def __init__(self, client, path: "str | None" = None) -> None:
+        self.client = client
+        self.path = path
+        self.digest = _client_digest(client)
+        self.users = {}  # type: dict[tuple[str, str], tuple[dict, dict]]
+        self.handles = {}  # type: dict[tuple[str, str, object], object]
+        self.injectable = "dataserver" in inspect.signature(client.create_user).parameters
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        if path and os.path.exists(path):
+            self.load(path)
+
+    def isolate(self) -> tuple:
+        """
+        Returns the calling thread's own dataserver and keyserver, cleared,
+        and makes the pool use them for calls from this thread.  A thread
+        keeps its servers from one call to the next, so accounts installed
+        into them can reuse the pool's handles.  Falls back to clearing and
+        returning the singletons for clients that cannot take servers.
+        """
+        servers = (dataserver, keyserver)
+        if self.injectable:
+            servers = getattr(self.local, "servers", None) or (Dataserver(), Keyserver())
+            self.local.servers = servers
+        for server in servers:
+            server.Clear()
+        return servers
+
+    def _target(self) -> tuple:
+        """
+        Returns the (dataserver, keyserver) calls from this thread go to.
+        """
+        return getattr(self.local, "servers", None) or (dataserver, keyserver)
+
+    def _servers(self) -> dict:
+        """
+        Returns the server arguments for client calls from this thread.
+        """
+        servers = getattr(self.local, "servers", None)
+        if servers is None:
+            return {}
+        return {"dataserver": servers[0], "keyserver": servers[1]}
+
+    def create_user(self, username: str, password: str):
+        """
+        Same as client.create_user, but reuses the pool's copy of the
+        account if there is one.
+        """
+        entries = self.users.get((username, password))
+        if entries is None:
+            entries = self._build(username, password)
+        data, keys = entries
+        servers = self._servers()
+        target = self._target()
+        if any(identifier in target[1].GetMap() for identifier in keys):
+            return self.client.create_user(username, password, **servers)  # fails as it should
+
+        for loc, value in data.items():
+            target[0].Set(loc, value)
+        for identifier, key in keys.items():
+            target[1].Set(identifier, key)
+        user = self.client.authenticate_user(username, password, **servers)
+        self.handles.setdefault((username, password, target[0]), user)
+        return user
+
+    def authenticate_user(self, username: str, password: str):
+        """
+        Same as client.authenticate_user, on this thread's servers.
+        """
+        return self.client.authenticate_user(username, password, **self._servers())
+
+    def _build(self, username: str, password: str) -> tuple[dict, dict]:
+        """
+        Creates the account on this thread's servers, emptied, records its
+        entries and leaves the servers as they were.
+        """
+        servers = self._servers()
+        target = self._target()
+        saved = snapshot.dumps(*target)
+        for server in target:
+            server.Clear()
+        try:
+            self.handles[(username, password, target[0])] = \
+                self.client.create_user(username, password, **servers)
+            entries = dict(target[0].GetMap()), dict(target[1].GetMap())
+        finally:
+            snapshot.loads(saved, *target)
+        self.users[(username, password)] = entries
+        if self.path:
+            with self.lock:
+                # Other processes may have added accounts to the file meanwhile.
+                if os.path.exists(self.path):
+                    self.load(self.path)
+                self.save(self.path)
+        return entries
+
+    def save(self, path: str) -> None:
+        parts = [_HEADER.pack(_MAGIC, self.digest)]
+        for (username, password), (data, keys) in self.users.items():
+            servers = Dataserver(), Keyserver()
+            servers[0].data, servers[1].data = data, keys
+            name, secret = username.encode(), password.encode()
+            blob = snapshot.dumps(*servers)
+            parts += [_ENTRY.pack(len(name), len(secret), len(blob)), name, secret, blob]
+        temporary = f"{path}.{os.getpid()}.{threading.get_ident()}"
+        with open(temporary, "wb") as f:
+            f.write(b"".join(parts))
+        os.replace(temporary, path)
+
+    def load(self, path: str) -> None:
+        with open(path, "rb") as f:
+            contents = f.read()
+        if contents[:_HEADER.size] != _HEADER.pack(_MAGIC, self.digest):
+            return  # built by another version of the client
+        offset = _HEADER.size
+        while offset < len(contents):
+            name_len, secret_len, blob_len = _ENTRY.unpack_from(contents, offset)
+            offset += _ENTRY.size
+            username = contents[offset:offset + name_len].decode()
+            offset += name_len
+            password = contents[offset:offset + secret_len].decode()
+            offset += secret_len
+            servers = Dataserver(), Keyserver()
+            snapshot.loads(contents[offset:offset + blob_len], *servers)
+            offset += blob_len
+            self.users.setdefault((username, password), (servers[0].data, servers[1].data))
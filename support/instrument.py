@@ -0,0 +1,302 @@
+##
+## instrument.py - Opt-in instrumentation for the support code
+##
+## This file records call counts, bytes processed and cumulative time for
+## every crypto, dataserver, keyserver and serialization call, grouped by
+## the client operation (upload_file, share_file, ...) that made them.
+##
+## Nothing is wrapped unless a Recorder is active: entering one swaps
+## wrappers into the support modules, and leaving the last active one
+## puts the original functions back, so there is no overhead otherwise.
+##
+## Usage:
+##
+##     import client
+##     from support.instrument import Recorder
+##
+##     with Recorder(client) as rec:
+##         u = client.create_user("usr", "pswd")
+##         u.upload_file("file1", b'testing data')
+##         print(u.last_op_stats.sets)
+##     print(rec.report())
+##
+
+import functools
+import threading
+import time
+import weakref
+
+import support.crypto as crypto
+import support.util as util
+from support.dataserver import Dataserver
+from support.keyserver import Keyserver
+
+
+def _arg(index):
+    """
+    Sizer counting the length of positional argument `index`.
+    """
+    def size(args, result):
+        return len(args[index]) if len(args) > index and isinstance(args[index], (bytes, str)) else 0
+    return size
+
+def _result(args, result):
+    return len(result) if isinstance(result, bytes) else 0
+
+def _nothing(args, result):
+    return 0
+
+# (owner, attribute, sizer) for every instrumented call.  For methods the
+# first positional argument is `self`.
+TARGETS = [
+    (crypto, "AsymmetricKeyGen", _nothing),
+    (crypto, "AsymmetricEncrypt", _arg(1)),
+    (crypto, "AsymmetricDecrypt", _arg(1)),
+    (crypto, "SignatureKeyGen", _nothing),
+    (crypto, "SignatureSign", _arg(1)),
+    (crypto, "SignatureVerify", _arg(1)),
+    (crypto, "Hash", _arg(0)),
+    (crypto, "HMAC", _arg(1)),
+    (crypto, "HMACEqual", _arg(0)),
+    (crypto, "HashKDF", _arg(0)),
+    (crypto, "PasswordKDF", _arg(0)),
+    (crypto, "SymmetricEncrypt", _arg(2)),
+    (crypto, "SymmetricDecrypt", _arg(1)),
+    (crypto, "SecureRandom", _result),
+    (util, "ObjectToBytes", _result),
+    (util, "BytesToObject", _arg(0)),
+    (Dataserver, "Set", _arg(2)),
+    (Dataserver, "Get", _result),
+    (Dataserver, "Delete", _nothing),
+    (Keyserver, "Set", _nothing),
+    (Keyserver, "Get", _nothing),
+]
+
+
+class Stat:
+    """
+    Counters for one instrumented function.
+    """
+    __slots__ = ("calls", "bytes", "seconds")
+
+    def __init__(self) -> None:
+        self.calls = 0
+        self.bytes = 0
+        self.seconds = 0.0
+
+    def __repr__(self) -> str:
+        return f"Stat(calls={self.calls}, bytes={self.bytes}, seconds={self.seconds:.6f})"
+
+
+class OpStats(dict):
+    """
+    Stats for a single operation call, keyed by function name, with
+    shorthands for the costs most efficiency budgets are written against.
+    """
+    ASYMMETRIC = ("crypto.AsymmetricKeyGen", "crypto.AsymmetricEncrypt",
+                  "crypto.AsymmetricDecrypt", "crypto.SignatureKeyGen",
+                  "crypto.SignatureSign", "crypto.SignatureVerify")
+    SYMMETRIC = ("crypto.SymmetricEncrypt", "crypto.SymmetricDecrypt")
+
+    def add(self, name: str, size: int, seconds: float) -> None:
+        stat = self.get(name)
+        if stat is None:
+            stat = self[name] = Stat()
+        stat.calls += 1
+        stat.bytes += size
+        stat.seconds += seconds
+
+    def calls(self, *names: str) -> int:
+        return sum(self[name].calls for name in names if name in self)
+
+    def bytes(self, *names: str) -> int:
+        return sum(self[name].bytes for name in names if name in self)
+
+    @property
+    def sets(self) -> int:
+        return self.calls("Dataserver.Set")
+
+    @property
+    def gets(self) -> int:
+        return self.calls("Dataserver.Get")
+
+    @property
+    def deletes(self) -> int:
+        return self.calls("Dataserver.Delete")
+
+    @property
+    def bytes_written(self) -> int:
+        return self.bytes("Dataserver.Set")
+
+    @property
+    def bytes_read(self) -> int:
+        return self.bytes("Dataserver.Get")
+
+    @property
+    def asymmetric_ops(self) -> int:
+        return self.calls(*self.ASYMMETRIC)
+
+    @property
+    def symmetric_ops(self) -> int:
+        return self.calls(*self.SYMMETRIC)
+
+    @property
+    def seconds(self) -> float:
+        return sum(stat.seconds for stat in self.values())
+
+
+_lock = threading.RLock()
+_active = []      # type: list[Recorder]
+_originals = []   # type: list[tuple[object, str, object]]
+_local = threading.local()
+_last = weakref.WeakKeyDictionary()  # type: weakref.WeakKeyDictionary[object, OpStats]
+
+def _ops() -> list:
+    """
+    Returns this thread's stack of (operation name, OpStats) in progress.
+    """
+    if not hasattr(_local, "ops"):
+        _local.ops = []
+    return _local.ops
+
+def _emit(name: str, size: int, seconds: float) -> None:
+    ops = _ops()
+    op = ops[-1][0] if ops else "-"
+    for recorder in _active:
+        recorder._add(op, name, size, seconds)
+    for _, stats in ops:
+        stats.add(name, size, seconds)
+
+def last_op_stats(obj: object) -> "OpStats | None":
+    """
+    Returns the OpStats of the most recent instrumented method call on
+    `obj`, or None if none was recorded.
+    """
+    return _last.get(obj)
+
+def _wrap_call(name: str, func, sizer):
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        result = None
+        start = time.perf_counter()
+        try:
+            result = func(*args, **kwargs)
+            return result
+        finally:
+            _emit(name, sizer(args, result), time.perf_counter() - start)
+    return wrapper
+
+def _wrap_op(name: str, func, method: bool):
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        ops, stats = _ops(), OpStats()
+        ops.append((name, stats))
+        try:
+            return func(*args, **kwargs)
+        finally:
+            ops.pop()
+            if method and args:
+                _last[args[0]] = stats
+    return wrapper
+
+def _patch(owner, attr: str, replacement) -> None:
+    _originals.append((owner, attr, getattr(owner, attr)))
+    setattr(owner, attr, replacement)
+
+def _install(clients) -> None:
+    for owner, attr, sizer in TARGETS:
+        name = f"{getattr(owner, '__name__', owner)}.{attr}".replace("support.", "")
+        _patch(owner, attr, _wrap_call(name, getattr(owner, attr), sizer))
+
+    # Public functions of each client module, and public methods of the
+    # classes it defines, mark the operation that calls are attributed to.
+    for module in clients:
+        for attr, value in list(vars(module).items()):
+            if attr.startswith("_") or getattr(value, "__module__", None) != module.__name__:
+                continue
+            if isinstance(value, type):
+                for method, func in list(vars(value).items()):
+                    if callable(func) and not method.startswith("_"):
+                        _patch(value, method, _wrap_op(f"{attr}.{method}", func, True))
+            elif callable(value):
+                _patch(module, attr, _wrap_op(attr, value, False))
+
+def _uninstall() -> None:
+    while _originals:
+        owner, attr, original = _originals.pop()
+        setattr(owner, attr, original)
+
+
+class Recorder:
+    """
+    Context manager that collects Stats for every instrumented call made
+    while it is active.  Pass the client module(s) whose operations calls
+    should be grouped by; calls made outside any operation are filed
+    under "-".  Recorders can be nested, but the set of client modules is
+    fixed by the outermost one.
+    """
+    def __init__(self, *clients) -> None:
+        self.clients = clients
+        self.stats = {}  # type: dict[str, OpStats]
+
+    def __enter__(self) -> "Recorder":
+        with _lock:
+            if not _active:
+                _install(self.clients)
+            _active.append(self)
+        return self
+
+    def __exit__(self, *exc) -> None:
+        with _lock:
+            _active.remove(self)
+            if not _active:
+                _uninstall()
+
+    def _add(self, op: str, name: str, size: int, seconds: float) -> None:
+        self.stats.setdefault(op, OpStats()).add(name, size, seconds)
+
+    def totals(self, op: "str | None" = None) -> dict[str, Stat]:
+        """
+        Returns per-function Stats summed over all operations, or for `op`.
+        """
+        result = {}
+        for name_op, functions in self.stats.items():
+            if op is not None and name_op != op:
+                continue
+            for name, stat in functions.items():
+                total = result.setdefault(name, Stat())
+                total.calls += stat.calls
+                total.bytes += stat.bytes
+                total.seconds += stat.seconds
+        return result
+
+    def report(self) -> str:
+        """
+        Returns a table of the collected Stats, one section per operation,
+        with the most expensive functions first.
+        """
+        lines = []
+        for op in sorted(self.stats):
+            functions = self.stats[op]
+            total = sum(stat.seconds for stat in functions.values())
+            lines.append(f"{op}  ({total * 1000:.2f} ms)")
+            for name, stat in sorted(functions.items(), key=lambda item: -item[1].seconds):
+                lines.append(f"    {name:<28} {stat.calls:>8} calls {stat.bytes:>12} bytes "
+                             f"{stat.seconds * 1000:>10.2f} ms")
+        return "\n".join(lines)
+
+
+# Example usage
+if __name__ == "__main__":
+    import client
+
+    with Recorder(client) as rec:
+        alice = client.create_user("alice", "pswd")
+        bob = client.create_user("bob", "pswd")
+        alice.upload_file("f", b'some file data' * 1000)
+        alice.append_file("f", b'more data')
+        alice.share_file("f", "bob")
+        bob.receive_file("f", "alice")
+        bob.download_file("f")
+        alice.revoke_file("f", "bob")
+    print(rec.report())
@@ -0,0 +1,232 @@
+##
+## sharded.py - Dataserver sharded across worker processes
+##
+## This file contains a drop-in replacement for the dataserver that splits
+## the memloc space by its first byte into N contiguous ranges, each held
+## by a plain Dataserver in its own worker process.  Shards share nothing;
+## the front end only routes calls.  Set, Get and Delete behave exactly as
+## on the in-process dataserver (one round trip to one shard each), and
+## the bulk calls SetMany, GetMany and DeleteMany send every shard its part
+## of the batch before waiting on any of them, so shards work in parallel.
+##
+## Usage:
+##
+##     from support.sharded import ShardedDataserver
+##
+##     with ShardedDataserver(4) as server:
+##         server.SetMany({loc: b'value' for loc in locs})
+##         values = server.GetMany(locs)
+##
+
+import multiprocessing
+import threading
+import weakref
+
+from support.dataserver import Dataserver
+
+
+def _serve(conn) -> None:
+    """
+    Worker loop: applies (operation, args) requests to a private Dataserver
+    and answers each with ("ok", result) or ("error", exception).
+    """
+    server = Dataserver()
+
+    def set_many(items: list) -> None:
+        for loc, val in items:
+            server.Set(loc, val)
+
+    def get_many(locs: list) -> dict:
+        found = {}
+        for loc in locs:
+            try:
+                found[loc] = server.Get(loc)
+            except ValueError:
+                pass
+        return found
+
+    def delete_many(locs: list) -> None:
+        for loc in locs:
+            try:
+                server.Delete(loc)
+            except ValueError:
+                pass
+
+    ops = {"Set": server.Set, "Get": server.Get, "Delete": server.Delete,
+           "SetMany": set_many, "GetMany": get_many, "DeleteMany": delete_many,
+           "GetMap": server.GetMap, "Clear": server.Clear, "Stats": server.Stats}
+    while True:
+        try:
+            request = conn.recv()
+        except EOFError:
+            return
+        if request is None:
+            return
+        op, args = request
+        try:
+            conn.send(("ok", ops[op](*args)))
+        except Exception as exc:
+            conn.send(("error", exc))
+
+def _stop(conns, processes) -> None:
+    for conn in conns:
+        try:
+            conn.send(None)
+            conn.close()
+        except OSError:
+            pass
+    for process in processes:
+        process.join(timeout=5)
+        if process.is_alive():
+            process.terminate()
+
+
+class ShardedDataserver:
+    """
+    Dataserver whose contents are partitioned by memloc prefix across
+    `shards` worker processes.
+    """
+    def __init__(self, shards: int = 4) -> None:
+        if not 1 <= shards <= 256:
+            raise ValueError("Shard count must be between 1 and 256")
+        self.shards = shards
+        self._conns = []
+        self._locks = [threading.Lock() for _ in range(shards)]
+        processes = []
+        for _ in range(shards):
+            ours, theirs = multiprocessing.Pipe()
+            process = multiprocessing.Process(target=_serve, args=(theirs,), daemon=True)
+            process.start()
+            theirs.close()
+            self._conns.append(ours)
+            processes.append(process)
+        self._finalizer = weakref.finalize(self, _stop, self._conns, processes)
+
+    def _shard(self, memloc: bytes) -> int:
+        if type(memloc) is not bytes or len(memloc) != 16:
+            Dataserver._validate(self, memloc)
+        return memloc[0] * self.shards >> 8
+
+    def _call(self, shard: int, op: str, *args):
+        with self._locks[shard]:
+            self._conns[shard].send((op, args))
+            status, result = self._conns[shard].recv()
+        if status == "error":
+            raise result
+        return result
+
+    def _fan_out(self, op: str, parts: "dict | None" = None) -> list:
+        """
+        Sends `op` with its part of the batch to every shard in `parts`
+        (every shard, without arguments, by default) before collecting any
+        answer, and returns the results.
+        """
+        if parts is None:
+            args = {shard: () for shard in range(self.shards)}
+        else:
+            args = {shard: (part,) for shard, part in parts.items()}
+        shards = sorted(args)
+        for shard in shards:
+            self._locks[shard].acquire()
+        try:
+            for shard in shards:
+                self._conns[shard].send((op, args[shard]))
+            answers = [self._conns[shard].recv() for shard in shards]
+        finally:
+            for shard in shards:
+                self._locks[shard].release()
+        for status, result in answers:
+            if status == "error":
+                raise result
+        return [result for _, result in answers]
+
+    def _split(self, locs) -> dict:
+        parts = {}
+        for loc in locs:
+            parts.setdefault(self._shard(loc), []).append(loc)
+        return parts
+
+    def Set(self, memloc: bytes, val: bytes) -> None:
+        """
+        Stores a value at a memory location.
+        """
+        self._call(self._shard(memloc), "Set", memloc, val)
+
+    def Get(self, memloc: bytes) -> bytes:
+        """
+        Retrieves a value from a memory location, or raises ValueError.
+        """
+        return self._call(self._shard(memloc), "Get", memloc)
+
+    def Delete(self, memloc: bytes) -> None:
+        """
+        Deletes a value from a memory location, or raises ValueError.
+        """
+        self._call(self._shard(memloc), "Delete", memloc)
+
+    def SetMany(self, items: dict) -> None:
+        """
+        Stores every {memloc: value} in `items`.
+        """
+        parts = {}
+        for loc, val in items.items():
+            if not isinstance(val, bytes):
+                raise ValueError("Dataserver can only store raw bytes")
+            parts.setdefault(self._shard(loc), []).append((loc, val))
+        self._fan_out("SetMany", parts)
+
+    def GetMany(self, memlocs) -> dict:
+        """
+        Returns {memloc: value} for the given memlocs that hold a value.
+        """
+        found = {}
+        for part in self._fan_out("GetMany", self._split(memlocs)):
+            found.update(part)
+        return found
+
+    def DeleteMany(self, memlocs) -> None:
+        """
+        Deletes the given memlocs, ignoring ones that hold no value.
+        """
+        self._fan_out("DeleteMany", self._split(memlocs))
+
+    ##################################################################
+    # Testing helpers, as on the in-process dataserver.
+    ##################################################################
+
+    def GetMap(self) -> dict:
+        """
+        Returns a copy of the entire server contents.
+        """
+        contents = {}
+        for part in self._fan_out("GetMap"):
+            contents.update(part)
+        return contents
+
+    def Stats(self) -> dict:
+        """
+        Returns the shards' Stats() summed.
+        """
+        totals = {}
+        for stats in self._fan_out("Stats"):
+            for name, value in stats.items():
+                totals[name] = totals.get(name, 0) + value
+        return totals
+
+    def Clear(self) -> None:
+        """
+        Deletes the entire server contents.
+        """
+        self._fan_out("Clear")
+
+    def close(self) -> None:
+        """
+        Stops the worker processes.
+        """
+        self._finalizer()
+
+    def __enter__(self) -> "ShardedDataserver":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
@@ -0,0 +1,108 @@
+##
+## snapshot.py - Saving and loading dataserver and keyserver state
+##
+## This file saves the contents of both servers to one packed file and
+## loads them back, so fixtures with many users (whose RSA key generation
+## dominates setup time) are created once and then restored in
+## milliseconds.  It only uses the servers' public API (GetMap, Clear and
+## Set), so it works with the stock support files and with any server that
+## has the same interface, such as support.sharded.ShardedDataserver.
+##
+## Usage:
+##
+##     from support import snapshot
+##
+##     ... create users and files ...
+##     snapshot.save("fixture.snap")
+##     ...
+##     snapshot.load("fixture.snap")   # both servers are back as saved
+##
+
+import struct
+
+from support.crypto import AsmPublicKey, AsymmetricEncryptKey, SignatureVerifyKey
+from support.dataserver import dataserver as _dataserver
+from support.keyserver import keyserver as _keyserver
+
+_MAGIC = b"DBXSNAP1"
+_HEADER = struct.Struct(">8sQQ")
+
+# Per-value header of the dataserver section: memloc and value length.
+_DATA_ENTRY = struct.Struct(">16sI")
+
+# Per-key header of the keyserver section: identifier length, key type and
+# key length.  Keys are stored in their serialized (PEM) form.
+_KEY_ENTRY = struct.Struct(">HBI")
+_KEY_TYPES = (AsmPublicKey, AsymmetricEncryptKey, SignatureVerifyKey)
+
+
+def _pack_data(dataserver) -> bytes:
+    pack = _DATA_ENTRY.pack
+    return b"".join(pack(loc, len(val)) + val for loc, val in dataserver.GetMap().items())
+
+def _unpack_data(section: bytes) -> dict:
+    data, offset, size = {}, 0, len(section)
+    unpack, header = _DATA_ENTRY.unpack_from, _DATA_ENTRY.size
+    while offset < size:
+        loc, length = unpack(section, offset)
+        offset += header + length
+        if offset > size:
+            raise ValueError("Truncated dataserver snapshot")
+        data[loc] = section[offset - length:offset]
+    return data
+
+def _pack_keys(keyserver) -> bytes:
+    parts = []
+    for identifier, pk in keyserver.GetMap().items():
+        name, key = identifier.encode(), bytes(pk)
+        kind = _KEY_TYPES.index(type(pk)) if type(pk) in _KEY_TYPES else 0
+        parts += [_KEY_ENTRY.pack(len(name), kind, len(key)), name, key]
+    return b"".join(parts)
+
+def _unpack_keys(section: bytes) -> dict:
+    keys, offset, size = {}, 0, len(section)
+    while offset < size:
+        name_len, kind, key_len = _KEY_ENTRY.unpack_from(section, offset)
+        offset += _KEY_ENTRY.size
+        name = section[offset:offset + name_len].decode()
+        key = section[offset + name_len:offset + name_len + key_len]
+        offset += name_len + key_len
+        if offset > size or kind >= len(_KEY_TYPES):
+            raise ValueError("Malformed keyserver snapshot")
+        keys[name] = _KEY_TYPES[kind].from_bytes(key)
+    return keys
+
+
+def dumps(dataserver=_dataserver, keyserver=_keyserver) -> bytes:
+    """
+    Returns the contents of both servers as one snapshot.
+    """
+    keys, data = _pack_keys(keyserver), _pack_data(dataserver)
+    return _HEADER.pack(_MAGIC, len(keys), len(data)) + keys + data
+
+def loads(snapshot: bytes, dataserver=_dataserver, keyserver=_keyserver) -> None:
+    """
+    Replaces the contents of both servers with a snapshot from dumps.
+    """
+    if len(snapshot) < _HEADER.size:
+        raise ValueError("Not a server snapshot")
+    magic, keys_len, data_len = _HEADER.unpack_from(snapshot)
+    if magic != _MAGIC or _HEADER.size + keys_len + data_len != len(snapshot):
+        raise ValueError("Not a server snapshot")
+    view = memoryview(snapshot)
+    keys = _unpack_keys(bytes(view[_HEADER.size:_HEADER.size + keys_len]))
+    data = _unpack_data(snapshot[_HEADER.size + keys_len:])
+    keyserver.Clear()
+    dataserver.Clear()
+    for identifier, pk in keys.items():
+        keyserver.Set(identifier, pk)
+    for loc, val in data.items():
+        dataserver.Set(loc, val)
+
+def save(path: str, dataserver=_dataserver, keyserver=_keyserver) -> None:
+    with open(path, "wb") as f:
+        f.write(dumps(dataserver, keyserver))
+
+def load(path: str, dataserver=_dataserver, keyserver=_keyserver) -> None:
+    with open(path, "rb") as f:
+        loads(f.read(), dataserver, keyserver)
@@ -0,0 +1,179 @@
+##
+## storage.py - Storage overhead analyzer for the dataserver
+##
+## This file summarises what is stored on the dataserver: number of
+## entries, total bytes, a histogram of value sizes, and, given
+## attribution from the client, bytes per user, per file and per kind of
+## value (chunk, header, tree node, ...) together with the ratio of stored
+## bytes to plaintext file bytes.  Values that are plain JSON (as written
+## by util.ObjectToBytes) are counted separately along with the bytes their
+## base64 encoding adds.
+##
+## Attribution comes from hooks: any mapping {memloc: (filename, kind,
+## plaintext bytes)} per user, such as client.User.storage_map.
+##
+## Usage:
+##
+##     import client
+##     from support.storage import analyze
+##
+##     u = client.create_user("usr", "pswd")
+##     u.upload_file("file1", b'testing data')
+##     print(analyze({"usr": u.storage_map("file1")}).report())
+##
+
+import json
+
+from support.dataserver import dataserver
+
+
+class Usage:
+    """
+    Entry and byte counters for one group of stored values.
+    """
+    __slots__ = ("entries", "bytes", "plaintext")
+
+    def __init__(self) -> None:
+        self.entries = 0
+        self.bytes = 0
+        self.plaintext = 0
+
+    def add(self, size: int, plaintext: int = 0) -> None:
+        self.entries += 1
+        self.bytes += size
+        self.plaintext += plaintext
+
+    @property
+    def overhead(self) -> float:
+        """
+        Stored bytes per plaintext byte, or 0.0 if there is no plaintext.
+        """
+        return self.bytes / self.plaintext if self.plaintext else 0.0
+
+    def __repr__(self) -> str:
+        return f"Usage(entries={self.entries}, bytes={self.bytes}, plaintext={self.plaintext})"
+
+
+def _base64_overhead(obj) -> int:
+    """
+    Returns how many bytes the base64 encoding of bytes values (tagged
+    "^^^...$$$" by util.ObjectToBytes) adds to a decoded JSON value.
+    """
+    if isinstance(obj, str):
+        if obj.startswith("^^^") and obj.endswith("$$$"):
+            return len(obj) - (len(obj) - 6) * 3 // 4
+        return 0
+    if isinstance(obj, dict):
+        return sum(_base64_overhead(key) + _base64_overhead(value) for key, value in obj.items())
+    if isinstance(obj, list):
+        return sum(_base64_overhead(value) for value in obj)
+    return 0
+
+
+class StorageReport:
+    """
+    Summary of a dataserver map.  `by_user`, `by_file` and `by_kind` only
+    cover attributed values; the rest are counted in `unattributed`.
+    """
+    def __init__(self) -> None:
+        self.total = Usage()
+        self.histogram = {}     # type: dict[int, Usage]  (size rounded up to a power of 2)
+        self.by_user = {}       # type: dict[str, Usage]
+        self.by_file = {}       # type: dict[tuple[str, str], Usage]
+        self.by_kind = {}       # type: dict[str, Usage]
+        self.unattributed = Usage()
+        self.json = Usage()
+        self.base64_bytes = 0
+
+    @property
+    def overhead(self) -> float:
+        """
+        Total stored bytes per attributed plaintext byte.
+        """
+        plaintext = sum(usage.plaintext for usage in self.by_user.values())
+        return self.total.bytes / plaintext if plaintext else 0.0
+
+    def report(self) -> str:
+        lines = [f"{self.total.entries} entries, {self.total.bytes} bytes stored, "
+                 f"overhead {self.overhead:.3f} stored bytes per plaintext byte",
+                 f"{self.json.entries} JSON values ({self.json.bytes} bytes, "
+                 f"{self.base64_bytes} of them base64 expansion), "
+                 f"{self.unattributed.entries} unattributed ({self.unattributed.bytes} bytes)",
+                 "", f"{'size <=':>10} {'entries':>8} {'bytes':>12}"]
+        for bucket in sorted(self.histogram):
+            usage = self.histogram[bucket]
+            lines.append(f"{bucket:>10} {usage.entries:>8} {usage.bytes:>12}")
+
+        lines += ["", f"{'kind':<24} {'entries':>8} {'bytes':>12} {'avg':>8} {'share':>7}"]
+        for kind, usage in sorted(self.by_kind.items(), key=lambda item: -item[1].bytes):
+            lines.append(f"{kind:<24} {usage.entries:>8} {usage.bytes:>12} "
+                         f"{usage.bytes // usage.entries:>8} "
+                         f"{usage.bytes / self.total.bytes * 100:>6.1f}%")
+
+        for title, groups in (("user", self.by_user), ("file", self.by_file)):
+            lines += ["", f"{title:<24} {'entries':>8} {'bytes':>12} {'avg':>8} "
+                          f"{'plaintext':>12} {'overhead':>9}"]
+            for key, usage in sorted(groups.items(), key=lambda item: -item[1].bytes):
+                name = "/".join(key) if isinstance(key, tuple) else key
+                lines.append(f"{name:<24} {usage.entries:>8} {usage.bytes:>12} "
+                             f"{usage.bytes // usage.entries:>8} {usage.plaintext:>12} "
+                             f"{usage.overhead:>9.3f}")
+        return "\n".join(lines)
+
+
+def analyze(hooks: "dict[str, dict[bytes, tuple[str, str, int]]] | None" = None,
+            storage: "dict[bytes, bytes] | None" = None) -> StorageReport:
+    """
+    Summarises `storage` (by default dataserver.GetMap()).  `hooks` maps a
+    user label to that user's {memloc: (filename, kind, plaintext bytes)};
+    a memloc claimed by several users is attributed to the first.
+    """
+    storage = dataserver.GetMap() if storage is None else storage
+    owners = {}
+    for user, mapping in (hooks or {}).items():
+        for loc, (filename, kind, plaintext) in mapping.items():
+            owners.setdefault(loc, (user, filename, kind, plaintext))
+
+    result = StorageReport()
+    for loc, value in storage.items():
+        size = len(value)
+        result.total.add(size)
+        bucket = 1 << max(0, size - 1).bit_length()
+        result.histogram.setdefault(bucket, Usage()).add(size)
+
+        if value[:1] in (b'{', b'['):
+            try:
+                obj = json.loads(value)
+            except ValueError:
+                pass
+            else:
+                result.json.add(size)
+                result.base64_bytes += _base64_overhead(obj)
+
+        if loc not in owners:
+            result.unattributed.add(size)
+            continue
+        user, filename, kind, plaintext = owners[loc]
+        result.by_user.setdefault(user, Usage()).add(size, plaintext)
+        result.by_kind.setdefault(kind, Usage()).add(size, plaintext)
+        if filename != "-":
+            result.by_file.setdefault((user, filename), Usage()).add(size, plaintext)
+    return result
+
+
+# Example usage
+if __name__ == "__main__":
+    import random
+    import client
+
+    alice = client.create_user("alice", "pswd")
+    bob = client.create_user("bob", "pswd")
+    alice.upload_file("big", random.Random(1).randbytes(2**20))
+    alice.upload_file("small", b'a small file')
+    for i in range(100):
+        alice.append_file("small", b' line %d' % i)
+    alice.share_file("big", "bob")
+    bob.receive_file("big", "alice")
+    bob.upload_file("notes", b'notes ' * 1000)
+    print(analyze({"alice": alice.storage_map("big", "small"),
+                   "bob": bob.storage_map("big", "notes")}).report())
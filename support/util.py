@@ -9,13 +9,9 @@
 ##
 ## Author: wschor
 ##
-import code
 import json
 import base64
 
-import readline
-import rlcompleter
-
 
 def _print_bytes(b: bytes) -> None:
     """
@@ -152,6 +148,11 @@ class DropboxError(Exception):
 
 
 def start_repl(extra_vars=None):
+    # Only needed for the REPL, so not imported with the module.
+    import code
+    import readline
+    import rlcompleter
+
     vars = globals()
     if extra_vars:
         vars.update(extra_vars)
@@ -4,13 +4,19 @@
 ##
 
 import unittest
+import unittest.mock
+import random
 import string
 
 import support.crypto as crypto
 import support.util as util
 
-from support.dataserver import dataserver, memloc
-from support.keyserver import keyserver
+from support.dataserver import Dataserver, dataserver, memloc
+from support.keyserver import Keyserver, keyserver
+from support.instrument import Recorder
+from support import snapshot
+from support.sharded import ShardedDataserver
+from support.storage import analyze
 
 # Import your client
 import client as c
@@ -83,6 +89,569 @@ class ClientTests(unittest.TestCase):
         #       error needs to be passed to `assertRaises` as a lambda function.
         self.assertRaises(util.DropboxError, lambda: u.download_file("file1"))
 
+    def test_instances_share_session(self):
+        """
+        Checks that live handles for one account share a single session, and
+        that the session is dropped once the last handle goes away.
+        """
+        u1 = c.create_user("usr", "pswd")
+        u2 = c.authenticate_user("usr", "pswd")
+        self.assertIs(u1._session, u2._session)
+
+        self.assertRaises(util.DropboxError, lambda: c.authenticate_user("usr", "BAD"))
+
+        del u1, u2
+        self.assertNotIn((dataserver, "usr"), c._sessions)
+
+    def test_injected_servers(self):
+        """
+        Checks that users created on their own dataserver and keyserver only
+        ever touch those, and that accounts of the same name on different
+        servers are independent.
+        """
+        servers = [(Dataserver(), Keyserver()) for _ in range(2)]
+        users = [c.create_user("usr", "pswd", *pair) for pair in servers]
+        self.assertIsNot(users[0]._session, users[1]._session)
+        users[0].upload_file("f", b'first')
+        users[1].upload_file("f", b'second')
+        bob = c.create_user("bob", "pswd", *servers[0])
+        users[0].share_file("f", "bob")
+        bob.receive_file("f", "usr")
+        self.assertEqual(bob.download_file("f"), b'first')
+        self.assertEqual(c.authenticate_user("usr", "pswd", *servers[1]).download_file("f"),
+                         b'second')
+
+        self.assertEqual(dataserver.GetMap(), {})
+        self.assertEqual(keyserver.GetMap(), {})
+        self.assertRaises(util.DropboxError, lambda: c.authenticate_user("usr", "pswd"))
+        self.assertRaises(util.DropboxError,
+                          lambda: c.authenticate_user("bob", "pswd", *servers[1]))
+
+    def test_session_cache_sees_other_writers(self):
+        """
+        Checks that cached metadata is revalidated when another handle or
+        user changes the file.
+        """
+        u1 = c.create_user("usr1", "pswd")
+        u2 = c.create_user("usr2", "pswd")
+        u2_again = c.authenticate_user("usr2", "pswd")
+
+        u1.upload_file("f", b'one')
+        u1.share_file("f", "usr2")
+        u2.receive_file("f", "usr1")
+        self.assertEqual(u2.download_file("f"), b'one')
+
+        u1.append_file("f", b' two')
+        self.assertEqual(u2_again.download_file("f"), b'one two')
+
+        u1.revoke_file("f", "usr2")
+        self.assertRaises(util.DropboxError, lambda: u2.download_file("f"))
+
+    def test_upload_deduplicates_chunks(self):
+        """
+        Checks that a near-identical second file only stores the chunks
+        around the edit, and that overwriting releases unreferenced chunks.
+        """
+        u = c.create_user("usr", "pswd")
+        data = random.Random(1).randbytes(1024 * 1024)
+        edited = data[:200000] + b'inserted bytes' + data[200000:]
+
+        def stored():
+            return sum(len(v) for v in dataserver.GetMap().values())
+
+        u.upload_file("v1", data)
+        before = stored()
+        u.upload_file("v2", edited)
+        self.assertLess(stored() - before, len(data) // 3)
+
+        self.assertEqual(u.download_file("v1"), data)
+        self.assertEqual(u.download_file("v2"), edited)
+
+        u.upload_file("v2", b'small')
+        self.assertLess(stored(), before + 4096)
+        self.assertEqual(u.download_file("v1"), data)
+
+    def test_chunk_index_buckets_split(self):
+        """
+        Checks that chunk index buckets split once they grow past the limit,
+        so a tiny upload only rewrites a small bucket however much the user
+        has stored, and that deduplication and releasing still work across
+        split buckets.
+        """
+        with unittest.mock.patch.object(c, "_INDEX_BUCKETS", 2), \
+                unittest.mock.patch.object(c, "_INDEX_BUCKET_LIMIT", 4):
+            u = c.create_user("usr", "pswd")
+            data = random.Random(7).randbytes(4 * 1024 * 1024)
+            u.upload_file("big", data)
+            self.assertGreater(len(u.storage_map()), 2 * 2 + 1)
+
+            with unittest.mock.patch.object(dataserver, "Set", wraps=dataserver.Set) as s:
+                u.upload_file("tiny", b'thirteen byte')
+            written = sum(len(call.args[1]) for call in s.call_args_list)
+            self.assertLess(written, 2048)
+
+            before = len(dataserver.GetMap())
+            u.upload_file("copy", data)
+            self.assertLess(len(dataserver.GetMap()) - before, 8)
+            self.assertEqual(u.download_file("copy"), data)
+
+            u.upload_file("big", b'small')
+            u.upload_file("copy", b'small')
+            self.assertLess(sum(len(v) for v in dataserver.GetMap().values()), 64 * 1024)
+            self.assertEqual(u.download_file("tiny"), b'thirteen byte')
+
+    def test_overwrite_rewrites_only_changed_chunks(self):
+        """
+        Checks that overwriting a large file with a small edit only stores
+        the chunks around the edit, including when a recipient does it.
+        """
+        u1 = c.create_user("usr1", "pswd")
+        u2 = c.create_user("usr2", "pswd")
+        data = random.Random(2).randbytes(2 * 1024 * 1024)
+        u1.upload_file("f", data)
+        u1.share_file("f", "usr2")
+        u2.receive_file("f", "usr1")
+
+        for user, edit in ((u1, b'owner edit'), (u2, b'recipient edit')):
+            data = data[:1000000] + edit + data[1000000:]
+            with unittest.mock.patch.object(dataserver, "Set", wraps=dataserver.Set) as s:
+                user.upload_file("f", data)
+            written = sum(len(call.args[1]) for call in s.call_args_list)
+            self.assertLess(written, len(data) // 4)
+            self.assertEqual(u1.download_file("f"), data)
+            self.assertEqual(u2.download_file("f"), data)
+
+    def test_overwrite_after_revoke(self):
+        """
+        Checks that overwriting a file after a revoke (which rotates its
+        delta key) still only writes the changed chunks, and that
+        overwriting it again releases every chunk it no longer uses.
+        """
+        u1 = c.create_user("usr1", "pswd")
+        c.create_user("usr2", "pswd")
+        data = random.Random(4).randbytes(600 * 1024)
+        u1.upload_file("f", data)
+        u1.share_file("f", "usr2")
+        u1.revoke_file("f", "usr2")
+
+        data = data[:300000] + b'edit' + data[300000:]
+        with unittest.mock.patch.object(dataserver, "Set", wraps=dataserver.Set) as s:
+            u1.upload_file("f", data)
+        self.assertLess(sum(len(call.args[1]) for call in s.call_args_list), len(data) // 4)
+        self.assertEqual(u1.download_file("f"), data)
+
+        u1.upload_file("f", b'x')
+        self.assertLess(sum(len(v) for v in dataserver.GetMap().values()), 16 * 1024)
+        self.assertEqual(u1.download_file("f"), b'x')
+
+    def test_download_range(self):
+        """
+        Checks that ranged reads return the right bytes and only fetch the
+        chunks they overlap.
+        """
+        u = c.create_user("usr", "pswd")
+        data = random.Random(3).randbytes(1024 * 1024)
+        u.upload_file("f", data)
+        u.append_file("f", b'tail of the file')
+        data += b'tail of the file'
+
+        for offset, length in ((0, 10), (1000, 300000), (len(data) - 16, 16),
+                               (len(data) - 5, 100), (len(data), 10), (7, 0)):
+            self.assertEqual(u.download_range("f", offset, length),
+                             data[offset:offset + length])
+
+        with unittest.mock.patch.object(dataserver, "Get", wraps=dataserver.Get) as g:
+            self.assertEqual(u.download_range("f", len(data) - 4, 4), b'file')
+        self.assertLessEqual(g.call_count, 3)
+
+        self.assertRaises(util.DropboxError, lambda: u.download_range("f", -1, 5))
+        self.assertRaises(util.DropboxError, lambda: u.download_range("g", 0, 5))
+
+    def test_download_range_in_append_log(self):
+        """
+        Checks that a cold ranged read inside a large append only fetches
+        the appended chunks it overlaps.
+        """
+        u = c.create_user("usr", "pswd")
+        data = random.Random(5).randbytes(4 * 1024 * 1024)
+        u.upload_file("f", b'head')
+        u.append_file("f", data)
+        data = b'head' + data
+
+        for offset, length in ((0, 10), (2 * 1024 * 1024, 100)):
+            u._session.chunks = c._ChunkCache(dataserver)
+            with unittest.mock.patch.object(dataserver, "Get", wraps=dataserver.Get) as g:
+                self.assertEqual(u.download_range("f", offset, length),
+                                 data[offset:offset + length])
+            self.assertLessEqual(g.call_count, 6)
+            read = sum(len(dataserver.GetMap()[call.args[0]]) for call in g.call_args_list)
+            self.assertLess(read, 4 * c.CHUNK_SIZE)
+
+    def test_chunk_tree_integrity(self):
+        """
+        Checks that a cold ranged read only walks one path of the chunk tree,
+        and that tampering with any stored value is detected rather than
+        returning wrong data.
+        """
+        u = c.create_user("usr", "pswd")
+        u.upload_file("f", b'')
+        for i in range(150):
+            u.append_file("f", b'%03d' % i)
+        data = b''.join(b'%03d' % i for i in range(150))
+
+        u._session.records.clear()
+        with unittest.mock.patch.object(dataserver, "Get", wraps=dataserver.Get) as g:
+            self.assertEqual(u.download_range("f", 3 * 100, 3), b'100')
+        # file entry, header, root node, leaf node, chunk
+        self.assertEqual(g.call_count, 5)
+
+        # Recent appends are read through the append log instead.
+        u._session.records.clear()
+        with unittest.mock.patch.object(dataserver, "Get", wraps=dataserver.Get) as g:
+            self.assertEqual(u.download_range("f", 3 * 149, 3), b'149')
+        self.assertLessEqual(g.call_count, 3 + c._LOG_LIMIT)
+
+        for loc, value in list(dataserver.GetMap().items()):
+            dataserver.Set(loc, value[:-1] + bytes([value[-1] ^ 1]))
+            u._session.records.clear()
+            try:
+                self.assertEqual(u.download_file("f"), data)
+            except util.DropboxError:
+                pass
+            dataserver.Set(loc, value)
+
+    def test_append_cost_is_constant(self):
+        """
+        Checks that 10,000 successive appends keep a constant cost: the bytes
+        written and hashed per append do not grow with the file.
+        """
+        u = c.create_user("usr", "pswd")
+        u.upload_file("f", b'')
+
+        def window():
+            with unittest.mock.patch.object(dataserver, "Set", wraps=dataserver.Set) as s, \
+                 unittest.mock.patch.object(crypto, "Hash", wraps=crypto.Hash) as h:
+                for _ in range(500):
+                    u.append_file("f", b'0123456789abcdef')
+            written = sum(len(call.args[1]) for call in s.call_args_list)
+            hashed = sum(len(call.args[0]) for call in h.call_args_list)
+            return written, hashed
+
+        first = window()
+        for _ in range(18):
+            window()
+        last = window()
+
+        self.assertLess(last[0], first[0] * 1.5)
+        self.assertLess(last[1], first[1] * 1.5)
+        self.assertEqual(u.download_range("f", 16 * 9999, 16), b'0123456789abcdef')
+
+    def test_compact_file(self):
+        """
+        Checks that compacting a heavily appended shared file merges its
+        chunks without changing its contents for anyone.
+        """
+        u1 = c.create_user("usr1", "pswd")
+        u2 = c.create_user("usr2", "pswd")
+        u1.upload_file("f", b'start')
+        u1.share_file("f", "usr2")
+        u2.receive_file("f", "usr1")
+
+        data = b'start'
+        for i in range(300):
+            u2.append_file("f", b' %d' % i)
+            data += b' %d' % i
+        entries = len(dataserver.GetMap())
+
+        u1.compact_file("f")
+        self.assertLess(len(dataserver.GetMap()), entries // 10)
+        self.assertEqual(u1.download_file("f"), data)
+        self.assertEqual(u2.download_range("f", 100, 50), data[100:150])
+
+        u2.append_file("f", b' end')
+        self.assertEqual(u1.download_file("f"), data + b' end')
+        self.assertRaises(util.DropboxError, lambda: u1.compact_file("g"))
+
+    def test_chunk_compression(self):
+        """
+        Checks that compressible chunks are stored compressed, incompressible
+        ones are not expanded, and files stay readable when the setting changes.
+        """
+        rng = random.Random(4)
+        text = b''.join(b'%d INFO served item %d\n' % (i, rng.randrange(1000))
+                        for i in range(20000))
+        noise = rng.randbytes(len(text))
+
+        def stored():
+            return sum(len(v) for v in dataserver.GetMap().values())
+
+        u = c.create_user("usr", "pswd")
+        base = stored()
+        u.upload_file("text", text)
+        self.assertLess(stored() - base, len(text) // 3)
+        base = stored()
+        u.upload_file("noise", noise)
+        self.assertLess(stored() - base, len(noise) * 1.05)
+
+        try:
+            c.COMPRESSION = "lzma"
+            u.append_file("text", b'appended line\n')
+            c.COMPRESSION = "none"
+            self.assertEqual(u.download_file("text"), text + b'appended line\n')
+            self.assertEqual(u.download_file("noise"), noise)
+        finally:
+            c.COMPRESSION = "auto"
+
+    def test_instrumentation(self):
+        """
+        Checks that a Recorder attributes support calls to client operations
+        and removes its wrappers afterwards.
+        """
+        originals = (crypto.Hash, c.User.upload_file, c.create_user)
+        with Recorder(c) as rec:
+            u = c.create_user("usr", "pswd")
+            u.upload_file("f", b'testing data')
+            u.download_file("f")
+
+        self.assertEqual(rec.stats["create_user"]["crypto.AsymmetricKeyGen"].calls, 1)
+        self.assertEqual(rec.stats["create_user"]["crypto.SignatureKeyGen"].calls, 1)
+        self.assertGreater(rec.stats["User.upload_file"]["Dataserver.Set"].bytes, 12)
+        self.assertNotIn("Dataserver.Set", rec.stats["User.download_file"])
+        self.assertGreater(rec.totals()["Dataserver.Get"].calls, 0)
+        self.assertEqual((crypto.Hash, c.User.upload_file, c.create_user), originals)
+
+    def test_last_op_stats(self):
+        """
+        Checks per-operation cost budgets: an append does a constant number
+        of Sets regardless of file size, except that every _LOG_LIMIT + 1st
+        one folds the append log into the chunk tree, which costs at most
+        three more Sets (the tree's rightmost path), and sharing uses exactly
+        one public key encryption and one signature.
+        """
+        u1 = c.create_user("usr1", "pswd")
+        c.create_user("usr2", "pswd")
+        self.assertIsNone(u1.last_op_stats)
+
+        with Recorder(c):
+            for name, size in (("small", 10), ("large", 4 * 1024 * 1024)):
+                u1.upload_file(name, random.Random(5).randbytes(size))
+                self.assertGreaterEqual(u1.last_op_stats.bytes_written, size // 2)
+                for number in range(c._LOG_LIMIT + 2):
+                    u1.append_file(name, b'appended')
+                    stats = u1.last_op_stats
+                    if number == c._LOG_LIMIT:
+                        self.assertLessEqual(stats.sets, 6)
+                        self.assertLess(stats.bytes_written, 32 * 1024)
+                    else:
+                        self.assertLessEqual(stats.sets, 3)
+                        self.assertLess(stats.bytes_written, 2048)
+                    self.assertEqual(stats.asymmetric_ops, 0)
+
+            u1.share_file("small", "usr2")
+            self.assertEqual(u1.last_op_stats.asymmetric_ops, 2)
+            self.assertLessEqual(u1.last_op_stats.calls("Keyserver.Get"), 2)
+
+            self.assertRaises(util.DropboxError, lambda: u1.download_file("missing"))
+            self.assertEqual(u1.last_op_stats.sets, 0)
+
+    def test_batch(self):
+        """
+        Checks that a batch writes a file's header once for many appends,
+        that the writer sees its appends immediately while a recipient sees
+        the file as it was until the batch ends, and that stale records are
+        only deleted at the end.
+        """
+        u1 = c.create_user("usr1", "pswd")
+        u2 = c.create_user("usr2", "pswd")
+        u1.upload_file("file", b'start')
+        u1.share_file("file", "usr2")
+        u2.receive_file("file", "usr1")
+
+        expected = b'start'
+        with Recorder(c) as rec:
+            with u1.batch():
+                for i in range(40):
+                    u1.append_file("file", b' %d' % i)
+                    expected += b' %d' % i
+                self.assertEqual(u1.download_file("file"), expected)
+                self.assertEqual(u2.download_file("file"), b'start')
+                self.assertNotIn("Dataserver.Delete", rec.totals())
+            self.assertEqual(u2.download_file("file"), expected)
+        # one Set per append for its chunk and its log record, plus the
+        # folded tree nodes and a single header write at the end
+        self.assertLess(rec.totals()["Dataserver.Set"].calls, 2 * 40 + 10)
+
+        u3 = c.create_user("usr3", "pswd")
+        with u1.batch():
+            u1.upload_file("file", b'replaced')
+            u1.revoke_file("file", "usr2")
+            u1.share_file("file", "usr3")
+        u3.receive_file("file", "usr1")
+        self.assertEqual(u3.download_file("file"), b'replaced')
+        self.assertRaises(util.DropboxError, lambda: u2.download_file("file"))
+
+    def test_batch_conflict(self):
+        """
+        Checks that when a recipient appends to a file while the owner has
+        batched appends to it, the owner's batch fails on exit instead of
+        writing a header over the recipient's log record, and the file stays
+        readable and writable for both.
+        """
+        u1 = c.create_user("usr1", "pswd")
+        u2 = c.create_user("usr2", "pswd")
+        u1.upload_file("f", b'start')
+        u1.share_file("f", "usr2")
+        u2.receive_file("f", "usr1")
+
+        def batched():
+            with u1.batch():
+                u1.append_file("f", b' a1')
+                u2.append_file("f", b' b1')
+        self.assertRaises(util.DropboxError, batched)
+
+        for user in (u1, u2):
+            user._session.records.clear()
+            user._session.chunks = c._ChunkCache(dataserver)
+            self.assertEqual(user.download_file("f"), b'start b1')
+        u1.append_file("f", b' a2')
+        u2.compact_file("f")
+        self.assertEqual(u2.download_file("f"), b'start b1 a2')
+        u1.upload_file("f", b'over')
+        self.assertEqual(u2.download_file("f"), b'over')
+
+    def test_chunk_cache(self):
+        """
+        Checks that a repeated download is served from the chunk cache after
+        revalidating the file's metadata, that changes, tampering and
+        revocation are still noticed, and that the cache stays in budget.
+        """
+        u1 = c.create_user("usr1", "pswd")
+        u2 = c.create_user("usr2", "pswd")
+        data = random.Random(6).randbytes(1024 * 1024)
+        u1.upload_file("f", data)
+        u1.share_file("f", "usr2")
+        u2.receive_file("f", "usr1")
+        self.assertEqual(u2.download_file("f"), data)
+
+        with unittest.mock.patch.object(dataserver, "Get", wraps=dataserver.Get) as g:
+            self.assertEqual(u2.download_file("f"), data)
+        # file entry, access node, header
+        self.assertLessEqual(g.call_count, 3)
+
+        u1.append_file("f", b'more')
+        self.assertEqual(u2.download_file("f"), data + b'more')
+
+        header = u1._open("f")[2]
+        value = dataserver.Get(header)
+        dataserver.Set(header, value[:-1] + bytes([value[-1] ^ 1]))
+        self.assertRaises(util.DropboxError, lambda: u2.download_file("f"))
+        dataserver.Set(header, value)
+
+        u1.revoke_file("f", "usr2")
+        self.assertRaises(util.DropboxError, lambda: u2.download_file("f"))
+
+        with unittest.mock.patch.object(c, "CHUNK_CACHE_SIZE", 100 * 1024):
+            self.assertEqual(u1.download_file("f"), data + b'more')
+            self.assertLessEqual(u1._session.chunks.size, 100 * 1024)
+
+    @unittest.skipUnless(hasattr(dataserver, "Stats"), "stock dataserver has no Stats")
+    def test_dataserver_stats(self):
+        """
+        Checks that the dataserver's running byte total matches its contents,
+        and that invalid memlocs and values are still rejected.
+        """
+        u = c.create_user("usr", "pswd")
+        u.upload_file("f", random.Random(7).randbytes(300000))
+        u.append_file("f", b'more')
+        u.upload_file("f", b'small')
+        u.compact_file("f")
+
+        stats = dataserver.Stats()
+        self.assertEqual(stats["entries"], len(dataserver.GetMap()))
+        self.assertEqual(stats["stored_bytes"], sum(map(len, dataserver.GetMap().values())))
+
+        self.assertRaises(Exception, lambda: dataserver.Get(b'short'))
+        self.assertRaises(Exception, lambda: dataserver.Set(bytearray(16), b'value'))
+        self.assertRaises(ValueError, lambda: dataserver.Set(memloc.Make(), "text"))
+        dataserver.Clear()
+        self.assertEqual(dataserver.Stats()["stored_bytes"], 0)
+
+    def test_sharded_dataserver(self):
+        """
+        Checks that the sharded dataserver spreads values across its shards
+        and behaves like the in-process one, singly and in bulk.
+        """
+        with ShardedDataserver(3) as server:
+            locs = [memloc.Make() for _ in range(60)]
+            server.SetMany({loc: loc * 2 for loc in locs[:50]})
+            for loc in locs[50:]:
+                server.Set(loc, loc)
+            self.assertEqual(server.Get(locs[0]), locs[0] * 2)
+            self.assertEqual(len(server.GetMap()), 60)
+            self.assertEqual(server.GetMany(locs[45:55] + [memloc.Make()]),
+                             {loc: loc * (2 if i < 5 else 1) for i, loc in enumerate(locs[45:55])})
+
+            server.Delete(locs[0])
+            server.DeleteMany(locs[:10])
+            self.assertRaises(ValueError, lambda: server.Get(locs[0]))
+            self.assertRaises(ValueError, lambda: server.Delete(locs[0]))
+            self.assertRaises(Exception, lambda: server.Set(b'short', b'value'))
+
+            stats = server.Stats()
+            self.assertEqual(stats["entries"], 50)
+            self.assertEqual(stats["stored_bytes"], 40 * 32 + 10 * 16)
+            server.Clear()
+            self.assertEqual(server.GetMap(), {})
+
+    def test_snapshot_restore(self):
+        """
+        Checks that restoring a snapshot brings back users, files, shares and
+        public keys exactly, and replaces anything created after it.
+        """
+        u1 = c.create_user("usr1", "pswd")
+        c.create_user("usr2", "pswd")
+        u1.upload_file("f", b'snapshotted')
+        u1.share_file("f", "usr2")
+        saved = snapshot.dumps()
+        data, keys = dict(dataserver.GetMap()), dict(keyserver.GetMap())
+
+        c.create_user("usr3", "pswd")
+        u1.upload_file("f", b'changed')
+        snapshot.loads(saved)
+        self.assertEqual(dataserver.GetMap(), data)
+        self.assertEqual(keyserver.GetMap(), keys)
+        self.assertEqual(type(keyserver.Get("usr1/enc")), type(keys["usr1/enc"]))
+
+        u2 = c.authenticate_user("usr2", "pswd")
+        u2.receive_file("f", "usr1")
+        self.assertEqual(u2.download_file("f"), b'snapshotted')
+        self.assertRaises(util.DropboxError, lambda: c.authenticate_user("usr3", "pswd"))
+        self.assertRaises(ValueError, lambda: snapshot.loads(saved[:-1]))
+
+    def test_storage_analysis(self):
+        """
+        Checks that the storage analyzer attributes every stored value to
+        its user and file, and reports plaintext sizes and overhead.
+        """
+        u1 = c.create_user("usr1", "pswd")
+        u2 = c.create_user("usr2", "pswd")
+        data = random.Random(6).randbytes(200000)
+        u1.upload_file("f", data)
+        u1.append_file("f", b'more')
+        u1.share_file("f", "usr2")
+        u2.receive_file("f", "usr1")
+        u2.upload_file("g", b'text ' * 100)
+
+        result = analyze({"usr1": u1.storage_map("f"), "usr2": u2.storage_map("f", "g")})
+        self.assertEqual(result.total.entries, len(dataserver.GetMap()))
+        self.assertEqual(result.unattributed.entries, 0)
+        self.assertEqual(result.by_file[("usr1", "f")].plaintext, len(data) + 4)
+        self.assertEqual(result.by_file[("usr2", "g")].plaintext, 500)
+        self.assertGreater(result.by_kind["chunk"].bytes, len(data))
+        self.assertEqual(result.json.entries, 0)
+        self.assertGreater(result.overhead, 1.0)
+        self.assertIn("usr1/f", result.report())
+
     def test_the_next_test(self):
         """
         Implement more tests by defining more functions like this one!
@@ -0,0 +1,143 @@
+##
+## test_efficiency.py - Efficiency regression tests for your client
+##
+## These tests measure dataserver traffic with support.instrument and check
+## how the cost of each operation scales, rather than what it returns:
+##
+##   - append_file bandwidth, amortized over folds of the append log, only
+##     grows with the depth of the file's chunk tree
+##   - revoke_file cost does not depend on the file size
+##   - download_file cost is linear in the file size
+##   - share_file cost does not depend on the number of existing recipients
+##
+## File sizes run from 1 KB up to EFFICIENCY_MAX_MB megabytes (default 4,
+## set it to 64 in the environment for the full range).
+##
+
+import os
+import random
+import unittest
+
+import support.util as util
+
+from support.dataserver import dataserver
+from support.keyserver import keyserver
+from support.instrument import Recorder
+
+from support.fixtures import UserPool
+
+import client as c
+
+
+MAX_SIZE = int(float(os.environ.get("EFFICIENCY_MAX_MB", "4")) * 2**20)
+SIZES = [size for size in (2**10, 2**16, 2**20, 2**22, 2**24, 2**26) if size <= MAX_SIZE]
+
+create_user = UserPool(c, os.environ.get("DROPBOX_USER_POOL")).create_user
+
+
+def cost(user: c.User, op: str, *args) -> tuple[int, int]:
+    """
+    Runs `user.<op>(*args)` with an empty session cache and returns the
+    dataserver (Sets, bytes moved) it took.
+    """
+    user._session.records.clear()
+    with Recorder(c):
+        getattr(user, op)(*args)
+    stats = user.last_op_stats
+    return stats.sets, stats.bytes_written + stats.bytes_read
+
+
+class EfficiencyTests(unittest.TestCase):
+    def setUp(self):
+        dataserver.Clear()
+        keyserver.Clear()
+        self.owner = create_user("owner", "pswd")
+        self.data = random.Random(1660).randbytes(max(SIZES))
+
+    def assertFlat(self, costs: dict, slack: float = 1.25):
+        """
+        Checks that no measured cost exceeds the smallest one by more than
+        a factor of `slack`.
+        """
+        low = min(costs.values())
+        for key, value in costs.items():
+            self.assertLessEqual(value, low * slack, f"{key}: {value} vs {low} ({costs})")
+
+    def test_append_is_independent_of_file_size(self):
+        """
+        Checks that appending 1 KB moves about the same number of bytes
+        whatever the size of the file, amortized over enough appends to fold
+        the append log into the chunk tree twice.  A fold rewrites the tree's
+        rightmost path, so its share grows with the depth of the tree
+        (logarithmically in the file size) and gets extra slack.
+        """
+        appends = 2 * c._LOG_LIMIT
+        costs = {}
+        for size in SIZES:
+            name = f"f{size}"
+            self.owner.upload_file(name, self.data[:size])
+            runs = [cost(self.owner, "append_file", name, b'a' * 1024) for _ in range(appends)]
+            self.assertLessEqual(sum(sets for sets, _ in runs), 3 * appends + 2 * 3)
+            costs[size] = sum(moved for _, moved in runs) / appends
+        self.assertFlat(costs, slack=2)
+
+    def test_revoke_is_independent_of_file_size(self):
+        """
+        Checks that revoking a recipient costs the same whatever the size of
+        the file.
+        """
+        create_user("recipient", "pswd")
+        recipient = c.authenticate_user("recipient", "pswd")
+        costs = {}
+        for size in SIZES:
+            name = f"f{size}"
+            self.owner.upload_file(name, self.data[:size])
+            self.owner.share_file(name, "recipient")
+            recipient.receive_file(name, "owner")
+            costs[size] = cost(self.owner, "revoke_file", name, "recipient")[1]
+            self.assertRaises(util.DropboxError, lambda: recipient.download_file(name))
+        self.assertFlat(costs)
+
+    def test_download_is_linear_in_file_size(self):
+        """
+        Checks that a cold download reads the file's bytes plus an overhead
+        proportional to its size, not more.
+        """
+        for size in SIZES:
+            name = f"f{size}"
+            self.owner.upload_file(name, self.data[:size])
+            _, moved = cost(self.owner, "download_file", name)
+            self.assertGreaterEqual(moved, size)
+            self.assertLess(moved, size * 1.05 + 4096, size)
+
+    def test_share_is_independent_of_recipient_count(self):
+        """
+        Checks that sharing with one more recipient costs the same whether
+        the file has 1 or 32 recipients already, and that revoking one in
+        the middle leaves the others' access intact.
+        """
+        self.owner.upload_file("f", self.data[:2**16])
+        recipients = []
+        costs = {}
+        for i in range(33):
+            name = f"r{i:03d}"
+            create_user(name, "pswd")
+            sets, moved = cost(self.owner, "share_file", "f", name)
+            if i in (1, 8, 32):
+                costs[i] = moved
+                self.assertEqual(sets, 4)
+            user = c.authenticate_user(name, "pswd")
+            user.receive_file("f", "owner")
+            recipients.append(user)
+        self.assertFlat(costs, slack=1.05)
+
+        self.owner.revoke_file("f", "r016")
+        for i, user in enumerate(recipients):
+            if i == 16:
+                self.assertRaises(util.DropboxError, lambda: user.download_file("f"))
+            else:
+                self.assertEqual(user.download_file("f"), self.data[:2**16])
+
+
+if __name__ == '__main__':
+    unittest.main()
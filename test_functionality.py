@@ -3,30 +3,36 @@
 ##
 
 
+import os
 import unittest
 import string
 
 import support.crypto as crypto
 import support.util as util
 
-from support.dataserver import dataserver, memloc
-from support.keyserver import keyserver
+from support.fixtures import UserPool
 
-
-from client import create_user, authenticate_user, User
+import client
 
 # Swap this with the previous line to test with the reference client
-#from dropbox_client_reference import create_user, authenticate_user, User
+#import dropbox_client_reference as client
+
+# Accounts are created once per run (or loaded from $DROPBOX_USER_POOL) and
+# copied into the test's cleared servers when it asks for them.  Each thread
+# running tests gets its own servers, which client calls made through the
+# pool are pointed at.
+pool = UserPool(client, os.environ.get("DROPBOX_USER_POOL"))
+create_user, authenticate_user, isolate = pool.create_user, pool.authenticate_user, pool.isolate
+User = client.User
 
 
 class ClientTests(unittest.TestCase):
     def setUp(self):
         """
         This function is automatically called before every test is run. It
-        clears the dataserver and keyserver to a clean state for each test case.
+        gives each test case its own dataserver and keyserver in a clean state.
         """
-        dataserver.Clear()
-        keyserver.Clear()
+        self.dataserver, self.keyserver = isolate()
 
     def test_create_user(self):
         """Checks user creation."""
@@ -102,10 +108,9 @@ class TestUserCreation(unittest.TestCase):
     def setUp(self):
         """
         This function is automatically called before every test is run. It
-        clears the dataserver and keyserver to a clean state for each test case.
+        gives each test case its own dataserver and keyserver in a clean state.
         """
-        dataserver.Clear()
-        keyserver.Clear()
+        self.dataserver, self.keyserver = isolate()
 
     def test_bad_password(self):
         """Checks password authentication."""
@@ -127,19 +132,18 @@ class TestFileFunctionality(unittest.TestCase):
     def setUp(self):
         """
         This function is automatically called before every test is run. It
-        clears the dataserver and keyserver to a clean state for each test case.
+        gives each test case its own dataserver and keyserver in a clean state.
         """
-        dataserver.Clear()
-        keyserver.Clear()
+        self.dataserver, self.keyserver = isolate()
 
     def test_upload(self):
         """Tests if uploading a file creates a new entry on the dataserver."""
         create_user("usr", "pswd")
         u = authenticate_user("usr", "pswd")
 
-        first_keys = list(dataserver.data.keys())
+        first_keys = list(self.dataserver.data.keys())
         u.upload_file("file1", b'testing data')
-        second_keys = list(dataserver.data.keys())
+        second_keys = list(self.dataserver.data.keys())
 
         self.assertGreater(len(second_keys), len(first_keys))
 
@@ -238,10 +242,9 @@ class TestSharingFunctionality(unittest.TestCase):
     def setUp(self):
         """
         This function is automatically called before every test is run. It
-        clears the dataserver and keyserver to a clean state for each test case.
+        gives each test case its own dataserver and keyserver in a clean state.
         """
-        dataserver.Clear()
-        keyserver.Clear()
+        self.dataserver, self.keyserver = isolate()
 
     def test_share_and_download(self):
         """Simple test of sharing and downloading a shared file."""